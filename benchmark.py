@@ -0,0 +1,266 @@
+import verification
+import verification_promise
+import parse_tables
+import predicate_maps
+import hardness_conditions.unit_propagation as unit_propagation
+import hardness_conditions.obstruction_matrix as obstruction_matrix
+from bitset import new_bitset, USE_NUMPY
+from predicate import Predicate
+from collections.abc import Callable
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+"""
+    Benchmarks of the hot paths of the verification.
+
+    Every benchmark times a function on a fixed corpus taken from the tables
+    (CORPUS_SIZE predicates spread evenly over each of the tables maximal_tractable,
+    minimal_hard, maximal_unknown and minimal_unknown), and reports the best of
+    several runs. The timings can be stored as a baseline, and later runs are compared
+    to it, flagging every benchmark that got slower by more than the threshold.
+
+    Timings of CPython and PyPy (and with or without numpy) are not comparable, so
+    there is a separate baseline for each, in BASELINE_DIR. Timings of different
+    machines are not comparable either, so the baselines are local to the machine
+    (and not committed): create one with --save-baseline before making a change.
+
+    Run `python benchmark.py --help` (or `pypy3 benchmark.py --help`) for the available options.
+"""
+
+BASELINE_DIR = 'benchmarks'
+
+# Number of predicates taken from each table
+CORPUS_SIZE = 3
+
+# Number of predicates tested for being representatives for k = 5
+# (enumerating all 2^32 predicates is not a benchmark)
+REPRESENTATIVES_RANGE = 2**16
+
+def get_corpus(k: int, corpus_size: int) -> list[Predicate]:
+    corpus = []
+    for table in verification.get_tables(k):
+        n = min(corpus_size, len(table))
+        corpus += [table[i * len(table) // n] for i in range(n)]
+    return corpus
+
+def clear_predicate_caches():
+    """
+        Empty the caches of data built per predicate (the tries and weight sets of the
+        obstruction searches, and the extensions of the obstruction matrices), which
+        the verification builds once for every predicate.
+    """
+    unit_propagation.clear_trie_cache()
+    unit_propagation.get_weights.cache_clear()
+    obstruction_matrix.get_extensions.cache_clear()
+
+def check_benchmark(module: str) -> Callable[[int, int], Callable[[], None]]:
+    """
+        Benchmark of the check function of a condition module on the corpus.
+        The caches of data built per predicate are emptied first, so that building
+        it is timed too.
+    """
+    def setup(k, corpus_size):
+        check = __import__(module, fromlist=['check']).check
+        corpus = get_corpus(k, corpus_size)
+        def run():
+            clear_predicate_caches()
+            return [check(predicate) for predicate in corpus]
+        return run
+    return setup
+
+def block_sym_benchmark(k, corpus_size):
+    from block_symmetry.check_block_sym import check_block_sym
+    corpus = get_corpus(k, corpus_size)
+    return lambda: [check_block_sym(predicate) for predicate in corpus]
+
+def table_bitset(k: int):
+    """
+        A bitset containing the permutations of the predicates in all tables for k.
+    """
+    b = new_bitset(2**(2**k))
+    for table in verification.get_tables(k):
+        for predicate in table:
+            for p in predicate_maps.orbit(predicate.bitmask, k, 'permutation'):
+                b[p] = 1
+    return b
+
+def downward_close_benchmark(k, corpus_size):
+    b = table_bitset(k)
+    # Closing takes the same number of passes whether or not b is already closed
+    return lambda: b.downward_close(range(1, 2**k))
+
+def upward_close_benchmark(k, corpus_size):
+    b = table_bitset(k)
+    return lambda: b.upward_close(range(1, 2**k))
+
+def set_operations_benchmark(k, corpus_size):
+    A = table_bitset(k)
+    B = A.copy()
+    B.upward_close(range(1, 2**k))
+    return lambda: ((A & B).sum(), (A | B).sum(), (A ^ B).sum())
+
+def representatives_benchmark(module) -> Callable[[int, int], Callable[[], None]]:
+    def setup(k, corpus_size):
+        if k <= 4:
+            return lambda: [len(block) for block in module.generate_representatives(k)]
+        # Only test a prefix of the predicates
+        group, start, step = ('permutation', 2, 2) if module is verification else ('permutation_xor', 1, 1)
+        return lambda: predicate_maps.orbit_minimal_shard((group, k, start, start + REPRESENTATIVES_RANGE * step, step))
+    return setup
+
+def parse_text_benchmark(k, corpus_size):
+    filenames = verification.get_table_filenames(k)
+    return lambda: [parse_tables.read_text(filename) for filename in filenames]
+
+def parse_binary_benchmark(k, corpus_size):
+    # Loads the binary versions of the tables from the cache
+    filenames = verification.get_table_filenames(k)
+    return lambda: [parse_tables.read_bitmasks(filename) for filename in filenames]
+
+# (name, setup, values of k, description)
+# setup(k, corpus_size) does the untimed preparation and returns the function to time
+BENCHMARKS = [
+    ('check_ADA_free', check_benchmark('hardness_conditions.check_ADA_free'), [3, 4, 5], 'hardness condition ADA-free on the corpus'),
+    ('check_ANDNOR_free', check_benchmark('hardness_conditions.check_ANDNOR_free'), [3, 4, 5], 'hardness condition ANDNOR-free on the corpus'),
+    ('check_UnCADA_free', check_benchmark('hardness_conditions.check_UnCADA_free'), [3, 4, 5], 'hardness condition UnCADA-free (unit propagation) on the corpus'),
+    ('check_UnDADA_free', check_benchmark('hardness_conditions.check_UnDADA_free'), [3, 4, 5], 'hardness condition UnDADA-free (unit propagation) on the corpus'),
+    ('check_bounded_matching', check_benchmark('hardness_conditions.check_bounded_matching'), [3, 4, 5], 'hardness condition bounded matching number on the corpus'),
+    ('check_bounded_inverted_matching', check_benchmark('hardness_conditions.check_bounded_inverted_matching'), [3, 4, 5], 'hardness condition bounded inverted matching number on the corpus'),
+    ('check_unate', check_benchmark('hardness_conditions.check_unate'), [3, 4, 5], 'hardness condition unate on the corpus'),
+    ('check_majority', check_benchmark('tractability_conditions.check_majority'), [3, 4, 5], 'tractability condition majority (LP) on the corpus'),
+    ('check_parity', check_benchmark('tractability_conditions.check_parity'), [3, 4, 5], 'tractability condition parity on the corpus'),
+    ('check_AT', check_benchmark('tractability_conditions.check_AT'), [3, 4, 5], 'tractability condition alternating threshold (LP) on the corpus'),
+    ('check_idem_even_parity', check_benchmark('tractability_conditions.check_idem_even_parity'), [3, 4, 5], 'tractability condition idempotenized even parity on the corpus'),
+    ('check_idem_minority', check_benchmark('tractability_conditions.check_idem_minority'), [3, 4, 5], 'tractability condition idempotenized minority (LP) on the corpus'),
+    ('check_block_sym', block_sym_benchmark, [3, 4, 5], 'block symmetric polymorphisms (SAT) on the corpus'),
+    ('downward_close', downward_close_benchmark, [3, 4, 5], 'downward closure of a bitset of size 2^(2^k)'),
+    ('upward_close', upward_close_benchmark, [3, 4, 5], 'upward closure of a bitset of size 2^(2^k)'),
+    ('set_operations', set_operations_benchmark, [3, 4, 5], 'and, or, xor and sum of bitsets of size 2^(2^k)'),
+    ('representatives', representatives_benchmark(verification), [3, 4, 5], 'enumeration of representatives (truncated for k = 5)'),
+    ('promise_representatives', representatives_benchmark(verification_promise), [3, 4, 5], 'enumeration of promise representatives (truncated for k = 5)'),
+    ('parse_text', parse_text_benchmark, [3, 4, 5], 'parsing of the tables in the .txt format'),
+    ('parse_binary', parse_binary_benchmark, [3, 4, 5], 'loading the tables in the binary format from the cache'),
+]
+
+# Modules needed by some of the benchmarks
+REQUIREMENTS = {
+    'check_majority': 'gurobipy',
+    'check_AT': 'gurobipy',
+    'check_idem_minority': 'gurobipy',
+    'check_block_sym': 'pysat',
+}
+
+def implementation() -> str:
+    """
+        Name of the Python implementation and bitset backend, used to pick the baseline.
+    """
+    return '%s_%s' % (platform.python_implementation().lower(), 'numpy' if USE_NUMPY else 'python')
+
+def baseline_path() -> str:
+    return os.path.join(BASELINE_DIR, 'baseline_%s.json' % implementation())
+
+# Minimum duration of a timed run, fast functions are called repeatedly to reach it
+MIN_TIME = 0.2
+
+def run_benchmark(setup: Callable, k: int, corpus_size: int, repeat: int) -> float:
+    """
+        Returns the best time per call of repeat timed runs. Before that, an untimed
+        warm-up run fills the memoization caches that are not emptied by the benchmark
+        itself (see clear_predicate_caches) and lets PyPy's JIT compile the code.
+    """
+    function = setup(k, corpus_size)
+
+    # Find the number of calls needed for a run to take at least MIN_TIME
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        if time.perf_counter() - start >= MIN_TIME:
+            break
+        calls *= 2
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the verification.')
+    parser.add_argument('-k', type=int, nargs='+', default=[3, 4], help='the values of k to benchmark (default: 3 4, k = 5 is slow and needs a lot of RAM)')
+    parser.add_argument('--only', nargs='+', choices=[name for name, setup, ks, description in BENCHMARKS], help='the benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of each benchmark, the best is reported (default: 3)')
+    parser.add_argument('--corpus-size', type=int, default=CORPUS_SIZE, help='number of predicates taken from each table (default: %d)' % CORPUS_SIZE)
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown compared to the baseline flagged as a regression (default: 0.2)')
+    parser.add_argument('--save-baseline', action='store_true', help='store the timings as the new baseline')
+    parser.add_argument('--json', metavar='PATH', help='write the timings to PATH')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(baseline_path()):
+        with open(baseline_path()) as f:
+            stored = json.load(f)
+        if stored['corpus_size'] != args.corpus_size:
+            print('Warning: The baseline was made with corpus size %d, not comparing.' % stored['corpus_size'])
+        else:
+            baseline = stored['timings']
+    elif not args.save_baseline:
+        print('No baseline found at %s, run with --save-baseline to create one.' % baseline_path())
+
+    timings = {}
+    regressions = []
+    for name, setup, ks, description in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        if name in REQUIREMENTS:
+            try:
+                __import__(REQUIREMENTS[name])
+            except ModuleNotFoundError:
+                print('Warning: Module %s not found. Skipping %s.' % (REQUIREMENTS[name], name))
+                continue
+
+        for k in args.k:
+            if k not in ks:
+                continue
+            key = '%s_k%d' % (name, k)
+            timings[key] = run_benchmark(setup, k, args.corpus_size, args.repeat)
+
+            line = '%-40s %12.3f ms' % (key, 1000 * timings[key])
+            if key in baseline:
+                ratio = timings[key] / baseline[key]
+                line += '   %5.2fx baseline' % ratio
+                if ratio > 1 + args.threshold:
+                    line += '   REGRESSION'
+                    regressions.append(key)
+            print(line, flush=True)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(), 'w') as f:
+            json.dump({
+                'implementation': implementation(),
+                'python': sys.version,
+                'corpus_size': args.corpus_size,
+                # Keep the timings of the benchmarks not run this time
+                'timings': dict(baseline, **timings),
+            }, f, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % baseline_path())
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'implementation': implementation(), 'timings': timings, 'regressions': regressions}, f, indent=2)
+
+    if regressions:
+        print('%d regression(s) compared to the baseline: %s' % (len(regressions), ', '.join(regressions)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
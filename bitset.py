@@ -4,8 +4,28 @@ from __future__ import annotations
     This is a basic implementation of bitset.
     It is far more memory efficient than using a Python list,
     which is very useful when dealing with 2^32 bits.
+
+    Two backends are provided with the same API:
+    * bitset, a pure Python implementation storing 63 bits per Python int.
+      This is the fastest option under PyPy.
+    * numpy_bitset, storing the bits in a contiguous uint64 numpy array.
+      The boolean operators and sum() are vectorized whole-array operations.
+      For 2^32 bits this uses 512 MB.
+
+    Use new_bitset(n) to get a bitset with the preferred available backend.
 """
 
+import platform
+from collections.abc import Iterable
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+# Element-wise access to numpy arrays is very slow under PyPy
+USE_NUMPY = np is not None and platform.python_implementation() != 'PyPy'
+
 class bitset:
     def __init__(self, n: int):
         self.n = n
@@ -71,3 +91,289 @@ class bitset:
         for i in range(len(data1)):
             data3[i] = data1[i] ^ data2[i]
         return C
+
+    # Big Python integers are used as scratch space for the closures,
+    # since shifting/masking those is done in C (also in PyPy).
+    _LEAF = 64
+
+    def _to_int(self, lo: int = 0, hi: int | None = None) -> int:
+        if hi is None:
+            hi = len(self.A)
+        if hi - lo <= self._LEAF:
+            x = 0
+            for i in range(hi - 1, lo - 1, -1):
+                x = (x << 63) | self.A[i]
+            return x
+        mid = (lo + hi) // 2
+        return self._to_int(lo, mid) | (self._to_int(mid, hi) << (63 * (mid - lo)))
+
+    def _from_int(self, x: int, lo: int = 0, hi: int | None = None):
+        if hi is None:
+            hi = len(self.A)
+        if hi - lo <= self._LEAF:
+            mask = (1 << 63) - 1
+            for i in range(lo, hi):
+                self.A[i] = x & mask
+                x >>= 63
+            return
+        mid = (lo + hi) // 2
+        shift = 63 * (mid - lo)
+        self._from_int(x & ((1 << shift) - 1), lo, mid)
+        self._from_int(x >> shift, mid, hi)
+
+    def _close(self, bits: Iterable[int] | None, downward: bool):
+        x = self._to_int()
+        for bit in lattice_bits(self.n, bits):
+            s = 1 << bit
+            M = lattice_mask(self.n, bit)
+            if downward:
+                x |= (x & M) >> s
+            else:
+                x |= (x & ~M) << s
+        self._from_int(x)
+
+    def downward_close(self, bits: Iterable[int] | None = None):
+        """
+            Close the set under removing elements, i.e. if i is in the set
+            then so is i & ~(1 << bit), for every bit in bits (default all bits).
+        """
+        self._close(bits, downward=True)
+
+    def upward_close(self, bits: Iterable[int] | None = None):
+        """
+            Close the set under adding elements, i.e. if i is in the set
+            then so is i | (1 << bit), for every bit in bits (default all bits).
+        """
+        self._close(bits, downward=False)
+
+    def save(self, path: str):
+        """
+            Store the bitset in the binary format described by save_header.
+        """
+        with open(path, 'wb') as f:
+            save_header(f, self.n)
+            f.write(self._to_int().to_bytes(8 * num_words(self.n), 'little'))
+
+    def count_spanned(self, masks: list[int]) -> int:
+        """
+            Given pairwise disjoint bitmasks, count the number of subsets S of masks
+            such that the union of S is in the set.
+        """
+        low = subset_sums(masks[:SPAN_CHUNK])
+        count = 0
+        for high in subset_sums(masks[SPAN_CHUNK:]):
+            for x in low:
+                count += self[x | high]
+        return count
+
+# Number of masks handled in bulk by count_spanned
+SPAN_CHUNK = 16
+
+def subset_sums(masks: list[int]) -> list[int]:
+    """
+        Return the unions of all subsets of the (pairwise disjoint) masks.
+    """
+    out = [0]
+    for mask in masks:
+        out += [x | mask for x in out]
+    return out
+
+def lattice_bits(n: int, bits: Iterable[int] | None) -> list[int]:
+    """
+        The bitset of size n = 2^L is viewed as the subset lattice of {0, ..., L - 1}.
+        Return the bits of the lattice to close over.
+    """
+    assert n > 1 and n & (n - 1) == 0, 'Closures require the size to be a power of 2'
+    L = n.bit_length() - 1
+    if bits is None:
+        return list(range(L))
+    bits = list(bits)
+    assert all(0 <= bit < L for bit in bits)
+    return bits
+
+def lattice_mask(n: int, bit: int) -> int:
+    """
+        Return the n-bit integer with bit i set iff bit "bit" of i is set.
+    """
+    s = 1 << bit
+    mask = ((1 << s) - 1) << s
+    length = 2 * s
+    while length < n:
+        mask |= mask << length
+        length *= 2
+    return mask
+
+def popcount(A) -> int:
+    """
+        Count the number of set bits in a uint64 numpy array
+    """
+    if hasattr(np, 'bitwise_count'):
+        # numpy >= 2.0
+        return int(np.bitwise_count(A).sum(dtype=np.uint64))
+
+    # Fall back to a lookup table over the bytes of A
+    table = np.array([i.bit_count() for i in range(256)], dtype=np.uint8)
+    return int(table[A.view(np.uint8)].sum(dtype=np.uint64))
+
+class numpy_bitset:
+    def __init__(self, n: int):
+        self.n = n
+        self.A = np.zeros((n >> 6) + 1, dtype=np.uint64)
+
+    def copy(self) -> numpy_bitset:
+        out = numpy_bitset(0)
+        out.n = self.n
+        out.A = self.A.copy()
+        return out
+
+    def __eq__(self, other: numpy_bitset) -> bool:
+        if isinstance(other, self.__class__):
+            return self.n == other.n and np.array_equal(self.A, other.A)
+        else:
+            return False
+
+    def __getitem__(self, i: int) -> int:
+        return (int(self.A[i >> 6]) >> (i & 63)) & 1
+
+    def __setitem__(self, i: int, val: int):
+        word = int(self.A[i >> 6])
+        if val:
+            self.A[i >> 6] = word | (1 << (i & 63))
+        else:
+            self.A[i >> 6] = word & ~(1 << (i & 63))
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def sum(self) -> int:
+        return popcount(self.A)
+
+    def __or__(self, B: numpy_bitset) -> numpy_bitset:
+        assert self.n == B.n
+        C = numpy_bitset(0)
+        C.n = self.n
+        C.A = self.A | B.A
+        return C
+
+    def __and__(self, B: numpy_bitset) -> numpy_bitset:
+        assert self.n == B.n
+        C = numpy_bitset(0)
+        C.n = self.n
+        C.A = self.A & B.A
+        return C
+
+    def __xor__(self, B: numpy_bitset) -> numpy_bitset:
+        assert self.n == B.n
+        C = numpy_bitset(0)
+        C.n = self.n
+        C.A = self.A ^ B.A
+        return C
+
+    def _close(self, bits: Iterable[int] | None, downward: bool):
+        A = self.A[:max(self.n >> 6, 1)]
+        for bit in lattice_bits(self.n, bits):
+            s = 1 << bit
+            if s < 64:
+                # Closure within each word
+                M = np.uint64(lattice_mask(64, bit))
+                if downward:
+                    A |= (A & M) >> np.uint64(s)
+                else:
+                    A |= (A & ~M) << np.uint64(s)
+            else:
+                # Closure between blocks of s // 64 words
+                V = A.reshape(-1, 2, s >> 6)
+                if downward:
+                    V[:, 0, :] |= V[:, 1, :]
+                else:
+                    V[:, 1, :] |= V[:, 0, :]
+
+    def downward_close(self, bits: Iterable[int] | None = None):
+        """
+            Close the set under removing elements, i.e. if i is in the set
+            then so is i & ~(1 << bit), for every bit in bits (default all bits).
+        """
+        self._close(bits, downward=True)
+
+    def upward_close(self, bits: Iterable[int] | None = None):
+        """
+            Close the set under adding elements, i.e. if i is in the set
+            then so is i | (1 << bit), for every bit in bits (default all bits).
+        """
+        self._close(bits, downward=False)
+
+    def save(self, path: str):
+        """
+            Store the bitset in the binary format described by save_header.
+        """
+        with open(path, 'wb') as f:
+            save_header(f, self.n)
+            self.A.astype('<u8', copy=False).tofile(f)
+
+    def count_spanned(self, masks: list[int]) -> int:
+        """
+            Given pairwise disjoint bitmasks, count the number of subsets S of masks
+            such that the union of S is in the set.
+        """
+        low = np.zeros(1, dtype=np.uint64)
+        for mask in masks[:SPAN_CHUNK]:
+            low = np.concatenate((low, low | np.uint64(mask)))
+        count = 0
+        for high in subset_sums(masks[SPAN_CHUNK:]):
+            i = low | np.uint64(high)
+            count += int(((self.A[i >> np.uint64(6)] >> (i & np.uint64(63))) & np.uint64(1)).sum())
+        return count
+
+MAGIC = b'BITSET01'
+HEADER_SIZE = 16
+
+def num_words(n: int) -> int:
+    """
+        Number of 64-bit words used to store a bitset of size n on disk.
+    """
+    return (n >> 6) + 1
+
+def save_header(f, n: int):
+    """
+        A saved bitset consists of a 16 byte header, the magic bytes MAGIC followed
+        by n as a little endian uint64, and then num_words(n) little endian uint64 words.
+        Bit i is stored in word i // 64 at position i % 64.
+    """
+    f.write(MAGIC)
+    f.write(n.to_bytes(8, 'little'))
+
+def load_header(f) -> int:
+    if f.read(8) != MAGIC:
+        raise ValueError('Not a bitset file')
+    return int.from_bytes(f.read(8), 'little')
+
+def load_mmap(path: str) -> bitset | numpy_bitset:
+    """
+        Load a bitset stored by save. With numpy the file is memory-mapped
+        (read only), so nothing is read into memory until it is used.
+        Without numpy the file is read into a pure Python bitset.
+    """
+    with open(path, 'rb') as f:
+        n = load_header(f)
+        if not USE_NUMPY:
+            out = bitset(n)
+            out._from_int(int.from_bytes(f.read(8 * num_words(n)), 'little'))
+            return out
+
+    out = numpy_bitset(0)
+    out.n = n
+    out.A = np.memmap(path, dtype='<u8', mode='r', offset=HEADER_SIZE, shape=(num_words(n),))
+    return out
+
+def new_bitset(n: int) -> bitset | numpy_bitset:
+    """
+        Create a bitset of size n, using numpy if it is available
+        (and we are not running PyPy).
+    """
+    if USE_NUMPY:
+        return numpy_bitset(n)
+    return bitset(n)
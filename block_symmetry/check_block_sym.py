@@ -1,3 +1,6 @@
+from predicate import Predicate, as_predicate
+import instrumentation
+
 """
 This file contain tests for if fiPCSP(A, OR) have symmetric/block-symmetric polymorphisms.
 This is done using the SAT-solver Glucose3 found in pysat.
@@ -19,7 +22,7 @@ def minkowski(A: set[tuple], B: set[tuple]) -> set[tuple]:
     return C
 
 CHECK_SYM_UP_TO = 31
-def check_sym(predicate: list[str]) -> tuple[int, list[int]]:
+def check_sym(predicate: Predicate | list[str]) -> tuple[int, list[int]]:
     """
     Check if predicate has symmetric polymorpisms of all odd arities <= CHECK_SYM_UP_TO.
 
@@ -33,8 +36,9 @@ def check_sym(predicate: list[str]) -> tuple[int, list[int]]:
     # We do not allow predicate to be empty
     assert predicate
 
-    k = len(predicate[0])
-    satis = [tuple(int(x) for x in assign) for assign in predicate]
+    predicate = as_predicate(predicate)
+    k = predicate.k
+    satis = predicate.tuples
     
     reachable = set(satis)
     L = 1
@@ -54,6 +58,7 @@ def check_sym(predicate: list[str]) -> tuple[int, list[int]]:
         for clause in SAT:
             g.add_clause([x + 1 if x < num_var else x-L-1 for x in clause])
 
+        instrumentation.count('sat_calls')
         if g.solve():
             # Solution found!
             assignment = g.get_model()
@@ -70,7 +75,7 @@ def check_sym(predicate: list[str]) -> tuple[int, list[int]]:
     return L, assignment
 
 CHECK_BLOCK_SYM_UP_TO = 11
-def check_block_sym(predicate: list[str]) -> tuple[int, list[int]]:
+def check_block_sym(predicate: Predicate | list[str]) -> tuple[int, list[int]]:
     """
     Check if predicate has L x (L+1) block symmetric polymorpisms, for all L <= CHECK_BLOCK_SYM_UP_TO.
 
@@ -84,8 +89,9 @@ def check_block_sym(predicate: list[str]) -> tuple[int, list[int]]:
     # We do not allow predicate to be empty
     assert predicate
 
-    k = len(predicate[0])
-    satis = [tuple(int(x) for x in assign) for assign in predicate]
+    predicate = as_predicate(predicate)
+    k = predicate.k
+    satis = predicate.tuples
 
     reachable_large = set(satis)
     L = 0
@@ -136,6 +142,7 @@ def check_block_sym(predicate: list[str]) -> tuple[int, list[int]]:
         # Require f(0) = 0
         g.add_clause([-1])
 
+        instrumentation.count('sat_calls')
         if g.solve():
             # Solution found! I.e. block symmetric polymorphism found
             assignment = g.get_model()
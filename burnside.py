@@ -0,0 +1,82 @@
+from bitset import bitset, numpy_bitset
+
+"""
+    Counting orbits of predicates using Burnside's lemma.
+
+    Let G be a group of maps on assignments (see predicate_maps.py), acting on
+    predicates. If C is a set of predicates closed under G, then by Burnside's lemma
+    the number of orbits in C is
+
+        1/|G| * sum over g in G of |{p in C : g(p) = p}|.
+
+    A predicate p is fixed by g iff p is a union of cycles of g (acting on assignments).
+    So the fixed points of g in C can be counted by looking up the 2^(number of cycles)
+    unions of cycles in the bitset of C. The count only depends on the conjugacy class of g,
+    so it is enough to do this once per conjugacy class.
+
+    This gives the number of orbits in C without enumerating any representatives.
+"""
+
+def cycles(mapping: list[int]) -> list[int]:
+    """
+        Return the cycles of mapping as bitmasks over the assignments.
+    """
+    seen = 0
+    out = []
+    for a in range(len(mapping)):
+        if (seen >> a) & 1:
+            continue
+        cycle = 0
+        while not (cycle >> a) & 1:
+            cycle |= 1 << a
+            a = mapping[a]
+        seen |= cycle
+        out.append(cycle)
+    return out
+
+def conjugacy_classes(maps: list[list[int]]) -> list[tuple[list[int], int]]:
+    """
+        Split the group maps into conjugacy classes.
+        Returns a list of (representative, size of class).
+    """
+    n = len(maps[0])
+    inverses = []
+    for h in maps:
+        hinv = [0] * n
+        for a in range(n):
+            hinv[h[a]] = a
+        inverses.append(hinv)
+
+    remaining = {tuple(g) for g in maps}
+    assert len(remaining) == len(maps)
+
+    out = []
+    for g in maps:
+        if tuple(g) not in remaining:
+            continue
+        conjugates = set()
+        for h, hinv in zip(maps, inverses):
+            conjugates.add(tuple(h[g[hinv[a]]] for a in range(n)))
+        remaining -= conjugates
+        out.append((g, len(conjugates)))
+    return out
+
+def count_fixed(C: bitset | numpy_bitset, mapping: list[int]) -> int:
+    """
+        Count the number of predicates p in C such that mapping(p) = p.
+    """
+    if all(mapping[a] == a for a in range(len(mapping))):
+        return C.sum()
+    return C.count_spanned(cycles(mapping))
+
+def count_orbits(C: bitset | numpy_bitset, classes: list[tuple[list[int], int]], exclude: list[int] = []) -> int:
+    """
+        Count the number of orbits of predicates in C, where C is closed under the group
+        with the given conjugacy classes.
+
+        The predicates in exclude should be fixed by the group, and are not counted.
+    """
+    group_size = sum(size for g, size in classes)
+    total = sum(size * count_fixed(C, g) for g, size in classes)
+    assert total % group_size == 0
+    return total // group_size - sum(C[p] for p in exclude)
@@ -0,0 +1,222 @@
+from bitset import bitset, numpy_bitset, load_mmap
+from array import array
+from collections.abc import Callable, Iterator
+import hashlib
+import os
+import sys
+import tempfile
+
+"""
+    On-disk cache of bitsets computed from the tables.
+
+    The cached files are keyed by a content hash of the table files they are
+    built from, so changing a table automatically invalidates its cache entries.
+    Loading a cached bitset memory-maps it (if numpy is available), which
+    takes milliseconds even for k = 5.
+
+    Long streams of integers (like the list of representatives) are stored as raw
+    little endian arrays, and are streamed from disk in blocks. If generating such a
+    stream is interrupted, the part already written is kept, and when resuming
+    (RESUME = True) the generation continues from where it stopped.
+"""
+
+CACHE_DIR = 'cache'
+
+# Set to False to always recompute
+ENABLED = True
+
+# Set to True to resume interrupted computations (see cached_blocks and checkpoint.py)
+RESUME = False
+
+# Bump this if the way the cached objects are computed changes
+VERSION = 1
+
+def content_hash(filenames: list[str]) -> str:
+    """
+        Hash of the contents of the given files (and of VERSION).
+    """
+    h = hashlib.sha256()
+    h.update(b'%d' % VERSION)
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            data = f.read()
+        h.update(b'%d:' % len(data))
+        h.update(data)
+    return h.hexdigest()[:16]
+
+def temp_path(path: str) -> str:
+    """
+        A new temporary file in the directory of path, to be renamed to path once written.
+        Every writer gets its own, so processes building the same file do not mix their writes.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path))
+    os.close(fd)
+    return tmp
+
+def cached_bitsets(name: str, filenames: list[str], build: Callable[[], tuple[bitset | numpy_bitset]]) -> tuple[bitset | numpy_bitset]:
+    """
+        Return build(), using the cache in CACHE_DIR if possible.
+
+        name identifies what is being built, and filenames are the (table) files
+        the result depends on.
+    """
+    if not ENABLED:
+        return build()
+
+    prefix = os.path.join(CACHE_DIR, '%s_%s' % (name, content_hash(filenames)))
+    index_path = prefix + '.count'
+
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            count = int(f.read())
+        try:
+            return tuple(load_mmap('%s_%d.bin' % (prefix, i)) for i in range(count))
+        except (OSError, ValueError):
+            print('Warning: Cached bitsets %s could not be loaded. Recomputing.' % prefix)
+
+    bitsets = build()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for i, b in enumerate(bitsets):
+            path = '%s_%d.bin' % (prefix, i)
+            tmp = temp_path(path)
+            b.save(tmp)
+            os.replace(tmp, path)
+        # Written last, so that an interrupted save is never used
+        tmp = temp_path(index_path)
+        with open(tmp, 'w') as f:
+            f.write(str(len(bitsets)))
+        os.replace(tmp, index_path)
+    except OSError as e:
+        print('Warning: Unable to write bitsets to the cache (%s).' % e)
+    return bitsets
+
+def cached_file(name: str, filenames: list[str], write: Callable[[str], None]) -> str | None:
+    """
+        Return the path of a cached file depending on the given (table) files.
+        If it does not exist yet, it is created by calling write(path).
+
+        Returns None if the cache is disabled or cannot be written to.
+    """
+    if not ENABLED:
+        return None
+
+    path = os.path.join(CACHE_DIR, '%s_%s.bin' % (name, content_hash(filenames)))
+    if os.path.exists(path):
+        return path
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = temp_path(path)
+        write(tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print('Warning: Unable to write %s to the cache (%s).' % (name, e))
+        return None
+    return path
+
+def read_blocks(path: str, typecode: str, block_size: int) -> Iterator[array]:
+    """
+        Stream a raw little endian array stored by cached_blocks, in blocks of block_size.
+    """
+    itemsize = array(typecode).itemsize
+    with open(path, 'rb') as f:
+        while True:
+            block = array(typecode)
+            block.frombytes(f.read(itemsize * block_size))
+            if not block:
+                return
+            if sys.byteorder == 'big':
+                block.byteswap()
+            yield block
+
+def lock_file(f) -> bool:
+    """
+        Try to get an exclusive lock on the open file f, without waiting.
+        Returns False if another process holds it (always True where locking is not supported).
+    """
+    try:
+        import fcntl
+    except ModuleNotFoundError:
+        return True
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+def cached_blocks(name: str, typecode: str, generate: Callable[[array], Iterator[array]], block_size: int) -> Iterator[array]:
+    """
+        Stream the blocks of the arrays yielded by generate(done), using the cache if possible.
+        generate(done) should yield the items following the last item of the array done.
+
+        The first time this is (fully) iterated over the blocks are also written to
+        CACHE_DIR, so later calls stream them from disk in blocks of block_size.
+        If RESUME is set, done contains the last item written by an interrupted earlier
+        call (the items before it are streamed from disk), otherwise it is empty.
+        The result only depends on name (and VERSION), not on any table files.
+
+        The partially written file is locked while it is being written. If another
+        process is writing it, the items are generated without being cached.
+    """
+    path = os.path.join(CACHE_DIR, '%s_v%d.bin' % (name, VERSION))
+    if not ENABLED:
+        yield from generate(array(typecode))
+        return
+
+    if os.path.exists(path):
+        yield from read_blocks(path, typecode, block_size)
+        return
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Opened for appending, so that nothing is truncated before the file is locked
+        f = open(path + '.tmp', 'ab')
+    except OSError as e:
+        print('Warning: Unable to write %s to the cache (%s).' % (name, e))
+        yield from generate(array(typecode))
+        return
+
+    # If this is interrupted, the incomplete file is kept so that it can be resumed
+    with f:
+        if not lock_file(f):
+            f.close()
+            yield from generate(array(typecode))
+            return
+
+        if os.path.exists(path):
+            # Finished by another process while waiting for the lock
+            f.close()
+            yield from read_blocks(path, typecode, block_size)
+            return
+
+        done = array(typecode)
+        size = 0
+        if RESUME:
+            # Drop a partially written item at the end
+            size = f.tell() // done.itemsize * done.itemsize
+        f.truncate(size)
+        if size:
+            yield from read_blocks(path + '.tmp', typecode, block_size)
+            with open(path + '.tmp', 'rb') as g:
+                g.seek(size - done.itemsize)
+                done.frombytes(g.read(done.itemsize))
+            if sys.byteorder == 'big':
+                done.byteswap()
+
+        for block in generate(done):
+            if sys.byteorder == 'big':
+                swapped = array(typecode, block)
+                swapped.byteswap()
+                swapped.tofile(f)
+            else:
+                block.tofile(f)
+            yield block
+        f.flush()
+
+        # Renamed while still holding the lock, so no other process can start writing to it
+        try:
+            os.replace(path + '.tmp', path)
+        except FileNotFoundError:
+            if not os.path.exists(path):
+                raise
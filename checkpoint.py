@@ -0,0 +1,126 @@
+import cache
+import instrumentation
+from predicate import Predicate, as_predicate
+from collections.abc import Callable
+import json
+import os
+
+"""
+    Checkpoints of long verification runs.
+
+    The results of the per-predicate checks (like is_hard) are appended to a
+    checkpoint file as soon as they are computed, and the steps of main.py that
+    succeed are recorded as well. When resuming (see cache.RESUME), recorded results
+    are reused instead of being recomputed, so an interrupted run only loses the
+    predicate it was checking. The intermediate structures (bitsets, representatives)
+    are resumed from the on-disk cache, see cache.py.
+
+    Checkpoints are keyed by a content hash of the table files, like the cache.
+"""
+
+CHECKPOINT_DIR = os.path.join(cache.CACHE_DIR, 'checkpoints')
+STEPS_FILE = os.path.join(CHECKPOINT_DIR, 'steps.jsonl')
+
+class Checkpoint:
+    """
+        Results of a check on predicates, recorded in a checkpoint file.
+        Used as a context manager:
+
+            with Checkpoint('hardness_k3', filenames) as checkpoint:
+                for predicate in predicates:
+                    assert checkpoint.check(predicate, is_hard)
+    """
+    def __init__(self, name: str, filenames: list[str]):
+        self.path = os.path.join(CHECKPOINT_DIR, '%s_%s.txt' % (name, cache.content_hash(filenames)))
+        self.results = {}
+        self.file = None
+        self.enabled = cache.ENABLED
+
+        if self.enabled and cache.RESUME and os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    # The last line may be incomplete if the run was interrupted
+                    try:
+                        p, result = line.split()
+                        self.results[int(p, 16)] = result == '1'
+                    except ValueError:
+                        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def check(self, predicate: Predicate | list[str], check: Callable[[Predicate | list[str]], bool]) -> bool:
+        """
+            Returns check(predicate), or the recorded result if there is one.
+        """
+        result = self.lookup(predicate)
+        if result is None:
+            result = bool(check(predicate))
+            self.store(predicate, result)
+        return result
+
+    def lookup(self, predicate: Predicate | list[str]) -> bool | None:
+        """
+            The recorded result of predicate, or None if there is none.
+        """
+        p = as_predicate(predicate).bitmask
+        if p in self.results:
+            instrumentation.count('checkpointed_predicates')
+            return self.results[p]
+        return None
+
+    def store(self, predicate: Predicate | list[str], result: bool):
+        p = as_predicate(predicate).bitmask
+        self.results[p] = result
+        self.record(p, result)
+
+    def record(self, p: int, result: bool):
+        if not self.enabled:
+            return
+        try:
+            if self.file is None:
+                os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+                # Rewrite the file from the results kept (all of them are recorded again)
+                self.file = open(self.path, 'w')
+                for q, r in self.results.items():
+                    if q != p:
+                        self.file.write('%x %d\n' % (q, r))
+            self.file.write('%x %d\n' % (p, result))
+            self.file.flush()
+        except OSError as e:
+            print('Warning: Unable to write checkpoint %s (%s).' % (self.path, e))
+            self.enabled = False
+
+def step_key(step: str, k: int, filenames: list[str]) -> str:
+    return '%s_k%d_%s' % (step, k, cache.content_hash(filenames))
+
+def load_completed_steps() -> dict[str, dict]:
+    """
+        The results of the steps recorded by record_completed_step, by step_key.
+    """
+    completed = {}
+    if not cache.ENABLED or not os.path.exists(STEPS_FILE):
+        return completed
+    with open(STEPS_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            completed[entry['key']] = entry['result']
+    return completed
+
+def record_completed_step(key: str, result: dict):
+    if not cache.ENABLED:
+        return
+    try:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(STEPS_FILE, 'a') as f:
+            f.write(json.dumps({'key': key, 'result': result}) + '\n')
+    except OSError as e:
+        print('Warning: Unable to write checkpoint %s (%s).' % (STEPS_FILE, e))
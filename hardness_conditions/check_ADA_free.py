@@ -1,4 +1,6 @@
 from hardness_conditions.unit_propagation import has_obstruction
+from predicate import Predicate
+from collections.abc import Callable
 
 """
     Checks if fiPCSP(A, OR) is t-ADA-free, for t <= 5.
@@ -6,7 +8,7 @@ from hardness_conditions.unit_propagation import has_obstruction
     Based directly on definition of ADA, definition 5.11.
 """
 
-def has_cd_obstruction(c: int, d: int, predicate: list[str]) -> bool | None:
+def has_cd_obstruction(c: int, d: int, predicate: Predicate | list[str]) -> bool | None:
     pattern = [1, d, c, d]
 
     def ADA(x: tuple[int]) -> int | None:
@@ -40,7 +42,7 @@ def has_cd_obstruction(c: int, d: int, predicate: list[str]) -> bool | None:
 
     return has_obstruction(pattern, predicate, ADA)
 
-def check_t_ADA_free(t: int, predicate: list[str]) -> bool:
+def check_t_ADA_free(t: int, predicate: Predicate | list[str]) -> bool:
     assert t >= 2
     for d in range(1, t):
         if not has_cd_obstruction(t - d, d, predicate):
@@ -48,8 +50,15 @@ def check_t_ADA_free(t: int, predicate: list[str]) -> bool:
     return True
 
 MAX_t = 5
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     for t in range(2, MAX_t + 1):
         if check_t_ADA_free(t, predicate):
             return True
     return False
+
+def get_searches() -> list[list[tuple[Callable, tuple[int, ...]]]]:
+    """
+    The searches done by check, grouped by t: has_cd_obstruction(c, d) for every split c + d = t.
+    fiPCSP(predicate, OR) is t-ADA-free if all of them find an obstruction.
+    """
+    return [[(has_cd_obstruction, (t - d, d)) for d in range(1, t)] for t in range(2, MAX_t + 1)]
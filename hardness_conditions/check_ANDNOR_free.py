@@ -1,20 +1,21 @@
+from predicate import Predicate, as_predicate
+
 """
     Checks if fiPCSP(A, OR) does not contain an ANDNOR.
 
     Based on sub-section A.7
 """
 
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
+    predicate = as_predicate(predicate)
     if not predicate:
         return False
-    k = len(predicate[0])
-    predicate_tuples = [tuple(int(c) for c in assign) for assign in predicate]
+    k = predicate.k
+    predicate_tuples = predicate.tuples
 
     # Create an obstruction matrix for ANDNOR
-    for bitstring0 in predicate:
-        for bitstring1 in predicate:
-            col0 = [int(x) for x in bitstring0]
-            col1 = [int(x) for x in bitstring1]
+    for col0 in predicate_tuples:
+        for col1 in predicate_tuples:
 
             if any(col0[i] == col1[i] == 1 for i in range(k)):
                 continue
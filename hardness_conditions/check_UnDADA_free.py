@@ -1,4 +1,6 @@
 from hardness_conditions.unit_propagation import has_obstruction
+from predicate import Predicate
+from collections.abc import Callable
 
 """
     Checks if fiPCSP(A, OR) does not contain a t-UnDADA, for t <= 5.
@@ -6,7 +8,7 @@ from hardness_conditions.unit_propagation import has_obstruction
     Based directly on definition of t-UnDADA, definition 5.20.
 """
 
-def has_t_obstruction(t:int, predicate: list[str]) -> bool | None:
+def has_t_obstruction(t:int, predicate: Predicate | list[str]) -> bool | None:
     pattern = [1, t-2, 1, 1, 1, 1, 1]
 
     def UnDADA(x: tuple[int]) -> int | None:
@@ -37,15 +39,21 @@ def has_t_obstruction(t:int, predicate: list[str]) -> bool | None:
 
     return has_obstruction(pattern, predicate, UnDADA)
 
-def check_t_UnDADA_free(t: int, predicate: list[str]) -> bool:
+def check_t_UnDADA_free(t: int, predicate: Predicate | list[str]) -> bool:
     assert t >= 3
     if not has_t_obstruction(t, predicate):
         return False
     return True
 
 MAX_t = 5
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     for t in range(3, MAX_t + 1):
         if check_t_UnDADA_free(t, predicate):
             return True
     return False
+
+def get_searches() -> list[list[tuple[Callable, tuple[int, ...]]]]:
+    """
+    The searches done by check, one for each t (see hardness_conditions/parallel.py).
+    """
+    return [[(has_t_obstruction, (t,))] for t in range(3, MAX_t + 1)]
@@ -1,4 +1,6 @@
 from hardness_conditions.unit_propagation import has_obstruction
+from predicate import Predicate
+from collections.abc import Callable
 
 """
     Checks if fiPCSP(A, OR) contains no polymorphisms with inverted matching number >= 6.
@@ -9,7 +11,7 @@ from hardness_conditions.unit_propagation import has_obstruction
     Based on Lemma A.3.
 """
 
-def has_t_obstruction(t: int, predicate: list[str]) -> bool | None:
+def has_t_obstruction(t: int, predicate: Predicate | list[str]) -> bool | None:
     pattern = [t+1, 1, 1]
 
     def f(x: tuple[int]) -> int | None:
@@ -33,15 +35,21 @@ def has_t_obstruction(t: int, predicate: list[str]) -> bool | None:
 
     return has_obstruction(pattern, predicate, f)
 
-def check_t_bounded_inverted_matching(t: int, predicate: list[str]) -> bool:
+def check_t_bounded_inverted_matching(t: int, predicate: Predicate | list[str]) -> bool:
     assert t >= 1
     if not has_t_obstruction(t, predicate):
         return False
     return True
 
 MAX_t = 6
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     for t in range(1, MAX_t + 1):
         if check_t_bounded_inverted_matching(t, predicate):
             return True
     return False
+
+def get_searches() -> list[list[tuple[Callable, tuple[int, ...]]]]:
+    """
+    The searches done by check, one for each t (see hardness_conditions/parallel.py).
+    """
+    return [[(has_t_obstruction, (t,))] for t in range(1, MAX_t + 1)]
@@ -1,10 +1,13 @@
 from functools import lru_cache as memoization
+from predicate import Predicate, as_predicate
+from hardness_conditions.obstruction_matrix import has_obstruction_matrix
+import predicate_maps
 
 """
     Checks if fiPCSP(A, OR) contains no polymorphisms with matching number >= 4.
     I.e. that fiPCSP(A, OR) has matching number <= 3.
-    This is done by going over every function of arity 5 with matching number >= 4,
-    and checking if there exists an obstruction.
+    This is done by going over every function of arity 5 with matching number >= 4
+    (up to permutations of the coordinates), and checking if there exists an obstruction.
 
     Based on Lemma A.2
 """
@@ -29,42 +32,27 @@ def odd_extension(f: int, L: int) -> int:
 def get_counter_examples(t:int) -> list[int]:
     """
     Find all idempotent functions with matching number t
-    and arity t + 1
+    and arity t + 1, up to permutations of the singletons
+
+    Permuting the coordinates of f permutes the columns of its obstruction matrices,
+    so only the smallest function in each orbit under the permutations of the
+    singletons {1}, ..., {t} is kept.
     """
     out = []
     L = t + 1
+    maps = predicate_maps.compiled_stabilizer_maps(L, tuple(1 << i for i in range(t)))
     for f in range(0, 2**(2**L//2), 2):
         f2 = odd_extension(f, L)
-        if has_atleast_matching_number_t(f2, t):
+        if has_atleast_matching_number_t(f2, t) and predicate_maps.is_orbit_minimal(f2, maps):
             out.append(f2)
     return out
 
-def has_matching_number_less_than_t(predicate: list[str], t: int) -> bool:
-    k = len(predicate[0])
+def has_matching_number_less_than_t(predicate: Predicate | list[str], t: int) -> bool:
+    predicate = as_predicate(predicate)
     # Go over all functions f of arity L = t + 1 with matching number t
     L = t + 1
     for f in get_counter_examples(t):
-        # Find all possible obstruction matrices of f
-
-        # Input where f is 0
-        zero_inputs = []
-        for bit in range(2**L):
-            if (f >> bit) & 1 == 0:
-                zero_inputs.append(bit)
-    
-        import itertools
-        for mat in itertools.product(zero_inputs, repeat=k):
-            # mat is a plausible k x L obstruction matrix
-           
-            # Check if columns of mat are contained in predicate
-            for j in range(L):
-                col = ''.join(str((mat[i] >> j) & 1) for i in range(k))
-                if col not in predicate:
-                    break
-            else:
-                # Obstruction matrix found of f
-                break
-        else:
+        if not has_obstruction_matrix(f, L, predicate):
             # No obstruction matrix of f exists
             return False
 
@@ -73,7 +61,7 @@ def has_matching_number_less_than_t(predicate: list[str], t: int) -> bool:
     return True
 
 MAX_t = 4
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     for t in range(3, MAX_t + 1):
         if has_matching_number_less_than_t(predicate, t):
             return True
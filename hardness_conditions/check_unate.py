@@ -1,4 +1,7 @@
 from functools import lru_cache as memoization
+from predicate import Predicate, as_predicate
+from hardness_conditions.obstruction_matrix import has_obstruction_matrix
+import predicate_maps
 
 """
     Checks if fiPCSP(A, OR) contains no non-unate polymorphisms.
@@ -14,8 +17,10 @@ from functools import lru_cache as memoization
 # f(0, 1, 1, 0, 0) = 0
 # f(1, 1, 0, 1, 0) = 0
 # f(1, 0, 1, 0, 1) = 0
+NON_UNATE_ZEROS = (0b00000, 0b00011, 0b01100, 0b11010, 0b10101)
+
 def is_non_unate(f: int) -> bool:
-    for x in 0b00000, 0b00011, 0b01100, 0b11010, 0b10101:
+    for x in NON_UNATE_ZEROS:
         if (f >> x) & 1:
             return False
     return True
@@ -31,42 +36,28 @@ def odd_extension(f: int, L: int) -> int:
 @memoization(maxsize=None)
 def get_counter_examples() -> list[int]:
     """
-    Find all idempotent functions that are non-unate according to Lemma A.1
+    Find all idempotent functions that are non-unate according to Lemma A.1,
+    up to permutations of the coordinates
+
+    Permuting the coordinates of f permutes the columns of its obstruction matrices,
+    so only the smallest function in each orbit under the permutations of the
+    coordinates fixing the five zeros of Lemma A.1 is kept.
     """
     out = []
     L = 5
+    maps = predicate_maps.compiled_stabilizer_maps(L, NON_UNATE_ZEROS)
     for f in range(0, 2**(2**L//2), 2):
         f2 = odd_extension(f, L)
-        if is_non_unate(f2):
+        if is_non_unate(f2) and predicate_maps.is_orbit_minimal(f2, maps):
             out.append(f2)
     return out
 
-def has_only_unate_polymorphisms(predicate: list[str]) -> bool:
-    k = len(predicate[0])
+def has_only_unate_polymorphisms(predicate: Predicate | list[str]) -> bool:
+    predicate = as_predicate(predicate)
     # Go over functions f of arity L = 5 that are not unate
     L = 5
     for f in get_counter_examples():
-        # Find all possible obstruction matrices of f
-
-        # Input where f is 0
-        zero_inputs = []
-        for bit in range(2**L):
-            if (f >> bit) & 1 == 0:
-                zero_inputs.append(bit)
-    
-        import itertools
-        for mat in itertools.product(zero_inputs, repeat=k):
-            # mat is a plausible k x L obstruction matrix
-           
-            # Check if columns of mat are contained in predicate
-            for j in range(L):
-                col = ''.join(str((mat[i] >> j) & 1) for i in range(k))
-                if col not in predicate:
-                    break
-            else:
-                # Obstruction matrix found of f
-                break
-        else:
+        if not has_obstruction_matrix(f, L, predicate):
             # No obstruction matrix of f exists
             return False
 
@@ -74,5 +65,5 @@ def has_only_unate_polymorphisms(predicate: list[str]) -> bool:
     # So predicate must only have unate polymorphisms
     return True
 
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     return has_only_unate_polymorphisms(predicate)
@@ -0,0 +1,74 @@
+from functools import lru_cache as memoization
+from predicate import Predicate
+
+"""
+    Search for an obstruction matrix of a single function f: {0,1}^L -> {0, 1}, given by
+    its truth table as an integer (bit x is f(x)).
+
+    An obstruction matrix is a k x L matrix where f is 0 on every row, and every column
+    is in the predicate. It is built row by row. The columns are kept as prefixes (the
+    bits of the rows chosen so far), and every column has to stay a prefix of some
+    assignment of the predicate, so dead ends are pruned as soon as any column leaves it.
+
+    Given the prefixes, the inputs that can be used as the next row form a subcube: the
+    columns that can only be extended by a 1 are fixed to 1, the columns that can only be
+    extended by a 0 are fixed to 0, and the rest are free. These are computed with bitmasks
+    over the columns, and the candidates are the submasks of the free columns where f is 0.
+"""
+
+@memoization(maxsize=2**10)
+def get_extensions(k: int, bitmask: int) -> list[tuple[int, int]]:
+    """
+    For each row i, a pair of bitmasks (ext0, ext1) over the prefixes v of length i, where
+    bit v of ext0 (ext1) is set iff appending a 0 (1) to v gives a prefix of an assignment
+    in the predicate.
+    """
+    extensions = []
+    for i in range(k):
+        ext0 = ext1 = 0
+        for a in range(2**k):
+            if (bitmask >> a) & 1:
+                prefix = a >> (k - i - 1)
+                if prefix & 1:
+                    ext1 |= 1 << (prefix >> 1)
+                else:
+                    ext0 |= 1 << (prefix >> 1)
+        extensions.append((ext0, ext1))
+    return extensions
+
+def has_obstruction_matrix(f: int, L: int, predicate: Predicate) -> bool:
+    """
+    Check if f of arity L has an obstruction matrix with columns in predicate.
+    """
+    k = predicate.k
+    extensions = get_extensions(k, predicate.bitmask)
+    full = 2**L - 1
+
+    def search(i, prefixes):
+        if i == k:
+            return True
+
+        ext0, ext1 = extensions[i]
+        can0 = can1 = 0
+        for j, v in enumerate(prefixes):
+            can0 |= ((ext0 >> v) & 1) << j
+            can1 |= ((ext1 >> v) & 1) << j
+
+        ones = full & ~can0
+        if ones & ~can1:
+            # Some column can not be extended at all
+            return False
+        free = can0 & can1
+
+        # Go over all submasks s of free
+        s = free
+        while True:
+            x = ones | s
+            if (f >> x) & 1 == 0:
+                if search(i + 1, [2 * v + ((x >> j) & 1) for j, v in enumerate(prefixes)]):
+                    return True
+            if s == 0:
+                return False
+            s = (s - 1) & free
+
+    return search(0, [0] * L)
@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections.abc import Callable
+from types import ModuleType
+from predicate import Predicate, as_predicate
+import hardness_conditions.unit_propagation as unit_propagation
+import instrumentation
+import multiprocessing
+
+"""
+    Concurrent evaluation of the obstruction searches of a single sub-condition.
+
+    The sub-conditions ADA-free, UnCADA-free, UnDADA-free and bounded inverted matching
+    hold iff, for some t, all the obstruction searches of t succeed (see get_searches
+    in their modules). These searches are independent, so with PROCESSES > 1 they are
+    run on a pool of processes. As soon as the outcome is decided, i.e. all searches of
+    some t have found an obstruction, or every t has a search that has not, the remaining
+    searches are cancelled. Searches that have not started are dropped, and running ones
+    stop the next time they check the shared generation counter (see
+    unit_propagation.cancelled), leaving the workers free for the next sub-condition.
+
+    Every worker keeps its own cache of tries, so this uses up to PROCESSES times as
+    much memory for them (see unit_propagation.TRIE_CACHE_BYTES).
+
+    The workers are started by the first search, and kept until shutdown() is called
+    (main.py does so after every step).
+"""
+
+# Number of processes running the searches of a sub-condition, 1 runs them one by one in this process
+PROCESSES = 1
+
+executor = None
+
+# Incremented whenever an evaluation is decided, which cancels its searches
+generation = None
+
+def init_worker(shared_generation):
+    global generation
+    generation = shared_generation
+
+def run_search(search: Callable, args: tuple[int, ...], predicate: Predicate, search_generation: int) -> tuple[bool | None, dict, dict]:
+    """
+        Run a single search in a worker. Also returns the counters and peaks of the
+        instrumentation, so they can be added to those of the main process.
+    """
+    unit_propagation.cancelled = lambda: generation.value != search_generation
+    instrumentation.COUNTERS.clear()
+    instrumentation.PEAKS.clear()
+    try:
+        result = search(*args, predicate)
+    except unit_propagation.SearchCancelled:
+        result = None
+    return result, dict(instrumentation.COUNTERS), dict(instrumentation.PEAKS)
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor, generation
+    if executor is None:
+        generation = multiprocessing.Value('i', 0, lock=False)
+        executor = ProcessPoolExecutor(PROCESSES, initializer=init_worker, initargs=(generation,))
+    return executor
+
+def shutdown():
+    """
+        Stop the worker processes, if they were started. The next search starts new ones.
+    """
+    global executor
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+        executor = None
+
+def check(module: ModuleType, predicate: Predicate | list[str]) -> bool:
+    """
+        Same as module.check(predicate), running the searches of module.get_searches()
+        concurrently and returning as soon as the result is known.
+    """
+    predicate = as_predicate(predicate)
+    groups = module.get_searches()
+    executor = get_executor()
+
+    futures = {}
+    for i, group in enumerate(groups):
+        for search, args in group:
+            futures[executor.submit(run_search, search, args, predicate, generation.value)] = i
+
+    # Number of searches of each t that still have to find an obstruction, None if one did not
+    remaining = [len(group) for group in groups]
+    try:
+        for future in as_completed(futures):
+            result, counters, peaks = future.result()
+            instrumentation.COUNTERS.update(counters)
+            for name, value in peaks.items():
+                instrumentation.peak(name, value)
+
+            i = futures[future]
+            if remaining[i] is None:
+                continue
+            if result:
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    return True
+            else:
+                remaining[i] = None
+                if all(r is None for r in remaining):
+                    return False
+    finally:
+        generation.value += 1
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,129 @@
+from predicate import Predicate, as_predicate
+from functools import lru_cache as memoization
+from types import ModuleType
+import hardness_conditions.parallel as parallel
+import instrumentation
+
+"""
+    Registry of the hardness sub-conditions, and a cost-aware evaluation of the
+    hardness conditions given by Theorems 5.16, 5.17, 5.18 and 5.21.
+
+    A predicate satisfies the hardness condition of a theorem if it satisfies all the
+    sub-conditions required by the theorem. Every sub-condition declares the theorems
+    requiring it, together with statistics of its cost and of how often it is satisfied.
+
+    Since the checks of the sub-conditions never give false positives, the result does
+    not depend on the order in which they are evaluated, as long as the evaluation
+    only stops when some theorem has all its sub-conditions satisfied (the predicate is
+    hard), or every theorem has a sub-condition that is not satisfied (it is not).
+    Results of sub-conditions shared by several theorems are reused.
+
+    The order is picked using the statistics: The next theorem to work on is the one
+    with the lowest expected cost of checking its remaining sub-conditions divided
+    by the probability that they are all satisfied, and within it the next sub-condition
+    is the one with the lowest cost divided by the probability that it is not satisfied
+    (the cheapest refutation first). The statistics are fixed, so the choice only
+    depends on the results known so far, and is computed once for each of them.
+
+    With parallel.PROCESSES > 1, the obstruction searches within a sub-condition are
+    run concurrently (see hardness_conditions/parallel.py).
+"""
+
+# (name, module, theorems requiring it, mean time in ms, fraction of predicates satisfying it)
+# The statistics were measured on a sample of 47 predicates of the tables for k = 5
+CONDITIONS = [
+    ('ADA_free', 'hardness_conditions.check_ADA_free', ['5.16', '5.17', '5.18', '5.21'], 9.4, 0.99),
+    ('bounded_matching', 'hardness_conditions.check_bounded_matching', ['5.16'], 19.4, 0.51),
+    ('bounded_inverted_matching', 'hardness_conditions.check_bounded_inverted_matching', ['5.17'], 103.4, 0.60),
+    ('unate', 'hardness_conditions.check_unate', ['5.18', '5.21'], 42.1, 0.55),
+    ('ANDNOR_free', 'hardness_conditions.check_ANDNOR_free', ['5.18'], 0.1, 0.62),
+    ('UnCADA_free', 'hardness_conditions.check_UnCADA_free', ['5.21'], 1808.5, 0.79),
+    ('UnDADA_free', 'hardness_conditions.check_UnDADA_free', ['5.21'], 260.8, 0.87),
+]
+
+THEOREMS = ['5.16', '5.17', '5.18', '5.21']
+
+# Probabilities are clamped away from 0 and 1 so that the ratios are finite
+EPSILON = 1e-3
+
+@memoization
+def get_module(name: str) -> ModuleType:
+    module = {name: module for name, module, theorems, cost, probability in CONDITIONS}[name]
+    return __import__(module, fromlist=['check'])
+
+def estimate(name: str) -> tuple[float, float]:
+    """
+        The cost and probability of being satisfied of a sub-condition.
+    """
+    cost, probability = {name: (cost, probability) for name, module, theorems, cost, probability in CONDITIONS}[name]
+    return cost, min(max(probability, EPSILON), 1 - EPSILON)
+
+def refutation_order(names: list[str]) -> list[str]:
+    """
+        The order to check sub-conditions that all need to be satisfied,
+        by cost divided by the probability of not being satisfied.
+    """
+    def ratio(name):
+        cost, probability = estimate(name)
+        return cost / (1 - probability)
+    return sorted(names, key=ratio)
+
+def expected_cost(names: list[str]) -> tuple[float, float]:
+    """
+        The expected cost of checking if all given sub-conditions are satisfied (in
+        refutation order), and the probability that they are.
+    """
+    cost = 0.0
+    probability = 1.0
+    for name in refutation_order(names):
+        c, p = estimate(name)
+        cost += probability * c
+        probability *= p
+    return cost, probability
+
+@memoization(maxsize=None)
+def next_step(results: frozenset[tuple[str, bool]]) -> str | bool:
+    """
+        Given the results of the sub-conditions evaluated so far, returns the
+        sub-condition to evaluate next, or the result if it is known.
+    """
+    results = dict(results)
+    required = {theorem: [name for name, module, theorems, cost, probability in CONDITIONS if theorem in theorems] for theorem in THEOREMS}
+
+    # Remaining sub-conditions of the theorems that can still be satisfied
+    remaining = []
+    for theorem in THEOREMS:
+        if any(results.get(name) is False for name in required[theorem]):
+            continue
+        unknown = [name for name in required[theorem] if name not in results]
+        if not unknown:
+            return True
+        remaining.append(unknown)
+
+    if not remaining:
+        return False
+
+    def ratio(names):
+        cost, probability = expected_cost(names)
+        return cost / max(probability, EPSILON)
+    return refutation_order(min(remaining, key=ratio))[0]
+
+def evaluate(name: str, predicate: Predicate) -> bool:
+    module = get_module(name)
+    instrumentation.count('subconditions_evaluated')
+    if parallel.PROCESSES > 1 and hasattr(module, 'get_searches'):
+        return parallel.check(module, predicate)
+    return bool(module.check(predicate))
+
+def is_hard(predicate: Predicate | list[str]) -> bool:
+    """
+        Check if predicate satisfies the hardness condition of any of the theorems,
+        evaluating the sub-conditions in a cost-aware order.
+    """
+    predicate = as_predicate(predicate)
+    results = frozenset()
+    while True:
+        step = next_step(results)
+        if step is True or step is False:
+            return step
+        results |= {(step, evaluate(step, predicate))}
@@ -1,4 +1,10 @@
 from collections.abc import Callable
+from array import array
+from collections import OrderedDict
+from functools import lru_cache as memoization
+from block_symmetry.check_block_sym import minkowski
+from predicate import Predicate, as_predicate
+import instrumentation
 
 """
 A home made SAT-solver used to find obstruction to functions
@@ -16,18 +22,83 @@ ultimately does not seem to affect the result.
 """
 
 class Trie:
-    def __init__(self):
-        self.root = {}
+    """
+    Trie of weight vectors with entries in 0..size, stored flat.
+
+    A node is an integer, its index in the flat arrays. The child of node along
+    weight w is children[node + w], or -1 if there is none, and keys[node] lists
+    the weights w for which node has a child, in insertion order.
+
+    After minimize() nodes with identical subtrees are merged, so it is then a DAG
+    where different prefixes with the same suffixes lead to the same node.
+    """
+    def __init__(self, size: int):
+        self.width = size + 1
+        self.root = 0
+        self.children = array('i', [-1] * self.width)
+        self.keys = [[]] + [None] * size
 
     def add(self, S):
-        node = self.root
+        assert self.root == 0, 'Cannot add to a minimized trie'
+        node = 0
         for c in S:
-            if c not in node:
-                node[c] = node = {}
-            else:
-                node = node[c]
+            child = self.children[node + c]
+            if child == -1:
+                child = len(self.children)
+                self.children[node + c] = child
+                self.children.extend([-1] * self.width)
+                self.keys += [[]] + [None] * (self.width - 1)
+                self.keys[node].append(c)
+            node = child
+
+    def minimize(self):
+        """
+        Merge all nodes with identical subtrees (hash-consing them bottom up).
+        """
+        width = self.width
+        children = array('i')
+        keys = []
+        canonical = {}
+        def visit(node):
+            signature = tuple((w, visit(self.children[node + w])) for w in self.keys[node])
+            new = canonical.get(signature)
+            if new is None:
+                new = canonical[signature] = len(children)
+                children.extend([-1] * width)
+                keys.extend([[w for w, child in signature]] + [None] * (width - 1))
+                for w, child in signature:
+                    children[new + w] = child
+            return new
+        self.root = visit(0)
+        self.children = children
+        self.keys = keys
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory usage in bytes.
+        """
+        num_nodes = len(self.children) // self.width
+        return self.children.itemsize * len(self.children) + 8 * len(self.keys) + 56 * num_nodes + 8 * (num_nodes - 1)
+
+# Maximum number of states remembered by the search to avoid exploring them twice
+VISITED_MAX_STATES = 2**20
+
+# If set, the search calls cancelled() when it starts and every CANCEL_INTERVAL expanded states,
+# and is abandoned by raising SearchCancelled if it returns True (see hardness_conditions/parallel.py)
+cancelled = None
+CANCEL_INTERVAL = 2**10
+
+class SearchCancelled(Exception):
+    pass
 
 def find_obstruction(pattern: list[int], zero_weights: list[tuple[int]], ktries: list[list[Trie]]) -> bool | None:
+    return propagate(pattern, zero_weights, ktries)[0]
+
+def propagate(pattern: list[int], zero_weights: list[tuple[int]], ktries: list[list[Trie]]) -> tuple[bool | None, set[tuple[int]]]:
+    """
+    Search for an obstruction using unit propagation, see find_obstruction.
+    Also returns the set of weights where f has been found to be 0.
+    """
     m = len(pattern)
     assert m == len(ktries[0])
     assert all(m == len(weight) for weight in zero_weights)
@@ -40,55 +111,181 @@ def find_obstruction(pattern: list[int], zero_weights: list[tuple[int]], ktries:
         raise ValueError('Function given is not foldable')
 
     k = len(ktries)
+    if cancelled is not None and cancelled():
+        raise SearchCancelled()
     
     function_size = 1
     for pat in pattern:
         function_size *= pat + 1
 
     from itertools import product
+    from operator import add, getitem
     
     from collections import defaultdict
-    waiting_list = defaultdict(list)
 
-    DFS = [(tuple(trie.root for trie in ktries[i]),  0) for i in range(k)]
+    kchildren = [[trie.children for trie in tries] for tries in ktries]
+    kkeys = [[trie.keys for trie in tries] for tries in ktries]
+
+    # Pending DFS states are indexed by the unknown weight of the row they are blocked on.
+    # They are resumed if f of that weight is fixed to 0, and dropped if it is fixed to 1.
+    watching = defaultdict(list)
+    pending = 0
+
+    # Statistics, reported to the instrumentation
+    states_expanded = propagations = max_frontier = 0
+
+    # The searches for coordinates with the same tries (i.e. coordinates that are
+    # symmetric in the predicate, see get_trie) are equivalent, so only one is done
+    roots = {}
+    for last in range(k):
+        roots.setdefault(tuple(map(id, ktries[last])), last)
+
+    # A DFS state (last, nodes, dist) is a node of each of the tries ktries[last] and the current row
+    DFS = [(last, tuple(trie.root for trie in ktries[last]), 0) for last in roots.values()]
+
+    # As the tries are DAGs, different partial matrices can reach the same state. What
+    # happens below a state does not depend on how it was reached, so it is only explored
+    # once. At most VISITED_MAX_STATES states are remembered.
+    visited = set()
+    pruned = 0
 
+    found = False
     while DFS:
-        nodes, dist = DFS.pop()
+        if len(DFS) + pending > max_frontier:
+            max_frontier = len(DFS) + pending
+        last, nodes, dist = DFS.pop()
         if dist == k:
             # Obstruction found!
-            return True
+            found = True
+            break
+
+        state = (last, nodes)
+        if state in visited:
+            pruned += 1
+            continue
+        if len(visited) < VISITED_MAX_STATES:
+            visited.add(state)
+        states_expanded += 1
+        if cancelled is not None and states_expanded % CANCEL_INTERVAL == 0 and cancelled():
+            raise SearchCancelled()
 
-        for weight in product(*map(iter, nodes)):
+        children = kchildren[last]
+        for weight in product(*map(getitem, kkeys[last], nodes)):
             if weight in zero_weights:
                 # f of row in matrix is 0, continue with next row
-                DFS.append((tuple(node[w] for node,w in zip(nodes, weight)), dist + 1))
+                DFS.append((last, tuple(map(getitem, children, map(add, nodes, weight))), dist + 1))
             elif weight in one_weights:
                 # f of row in matrix is 1, cannot be obstruction
                 pass
             elif dist == k - 1:
                 # f of last row in matrix is unknown, force f of last row to be 1
                 # (unit propagation step)
+                propagations += 1
                 nweight = tuple(pattern[i] - weight[i] for i in range(m)) 
                 zero_weights.add(nweight)
                 one_weights.add(weight)
-                DFS += waiting_list[nweight]
-                del waiting_list[nweight]
-                del waiting_list[weight]
+                resumed = watching.pop(nweight, [])
+                DFS += resumed
+                pending -= len(resumed) + len(watching.pop(weight, []))
 
 #                if len(zero_weights) == function_size // 2:
 #                    print('Unit propagation fixed all function values.', flush=True)
             else:
                 # f-value of current row is unknown, wait for more information
-                waiting_list[weight].append((tuple(node[w] for node,w in zip(nodes, weight)), dist + 1))
+                watching[weight].append((last, tuple(map(getitem, children, map(add, nodes, weight))), dist + 1))
+                pending += 1
+
+    instrumentation.count('states_expanded', states_expanded)
+    instrumentation.count('propagations', propagations)
+    instrumentation.count('states_pruned', pruned)
+    instrumentation.peak('frontier', max_frontier)
+    if found:
+        return True, zero_weights
 
     if len(zero_weights) == function_size//2:
         # Polymorhpism from family exists
-        return False
+        return False, zero_weights
 
     # Unit propagation did not give enough information
-    return None
+    return None, zero_weights
+
+def swap_coordinates(predicate: Predicate, i: int, j: int) -> Predicate:
+    """
+    The predicate with coordinates i and j swapped.
+    """
+    bitmask = 0
+    for assign in predicate.tuples:
+        assign = list(assign)
+        assign[i], assign[j] = assign[j], assign[i]
+        a = 0
+        for bit in assign:
+            a = 2 * a + bit
+        bitmask |= 1 << a
+    return Predicate(predicate.k, bitmask)
+
+@memoization(maxsize=2**5)
+def get_weights(predicate: Predicate, pat: int) -> frozenset[tuple[int]]:
+    """
+    The weights (coordinate-wise sums) of all multisets of pat assignments of predicate.
+
+    This is the Minkowski sum of pat copies of predicate, computed one copy at a time.
+    The cost depends on the number of distinct weights, not on the number of multisets.
+    """
+    if pat == 1:
+        return frozenset(predicate.tuples)
+    return frozenset(minkowski(get_weights(predicate, pat - 1), predicate.tuples))
+
+def build_trie(predicate: Predicate, pat: int) -> Trie:
+    """
+    The trie of the weights of all multisets of pat assignments of predicate.
+    """
+    trie = Trie(pat)
+    for weight in sorted(get_weights(predicate, pat)):
+        trie.add(weight)
+    trie.minimize()
+    return trie
+
+# The tries are shared between all obstruction searches (many of which use the same
+# predicate and block sizes), and are evicted least recently used first when their
+# total size exceeds TRIE_CACHE_BYTES. clear_trie_cache() empties the cache.
+TRIE_CACHE_BYTES = 2**28
+trie_cache = OrderedDict()
+trie_cache_bytes = 0
+
+def clear_trie_cache():
+    global trie_cache_bytes
+    trie_cache.clear()
+    trie_cache_bytes = 0
+
+def get_trie(predicate: Predicate, pat: int, last: int) -> Trie:
+    """
+    The trie of weights of multisets of pat assignments of predicate, with coordinate
+    last swapped with the last coordinate. This is cached (see TRIE_CACHE_BYTES).
 
-def has_obstruction(pattern: list[int], predicate: list[str], family: Callable[[tuple[int]], int | None]) -> bool | None:
+    The cache is keyed by the predicate with the coordinates swapped, so the tries for
+    coordinates that are symmetric in the predicate are shared.
+    """
+    global trie_cache_bytes
+    k = predicate.k
+    if last != k - 1:
+        predicate = swap_coordinates(predicate, last, k - 1)
+    key = (k, predicate.bitmask, pat)
+
+    trie = trie_cache.get(key)
+    if trie is not None:
+        trie_cache.move_to_end(key)
+        return trie
+
+    instrumentation.count('tries_built')
+    trie = build_trie(predicate, pat)
+    trie_cache[key] = trie
+    trie_cache_bytes += trie.nbytes()
+    while trie_cache_bytes > TRIE_CACHE_BYTES and len(trie_cache) > 1:
+        key, evicted = trie_cache.popitem(last=False)
+        trie_cache_bytes -= evicted.nbytes()
+    return trie
+
+def has_obstruction(pattern: list[int], predicate: Predicate | list[str], family: Callable[[tuple[int]], int | None]) -> bool | None:
     """
     This answers the question if there exists an obstruction matrix for every function in a family of Boolean functions.
 
@@ -101,30 +298,122 @@ def has_obstruction(pattern: list[int], predicate: list[str], family: Callable[[
     (Same notition of blocks as in block-symmetric)
     The reason this is used is that it can significantly boost performance.
     """
-    from itertools import combinations
     from itertools import product
-    from itertools import combinations_with_replacement
-    def adder(*A):
-        ret = [0] * len(A[0])
-        for B in A:
-            for i,b in enumerate(B):
-                ret[i] += b
-        return ret
-
-    k = len(predicate[0])
-    ktries = [[] for _ in range(k)]
-    for pat in pattern:
-        for i in range(k):
-            ktries[i].append(Trie())
-        
-        for A in combinations_with_replacement(predicate, pat):
-            weight = adder(*([int(c) for c in bitstring] for bitstring in A))
-            for i in range(k):
-                # Swap so i is last
-                weight[i],weight[-1] = weight[-1],weight[i]
-                ktries[i][-1].add(weight)
-                weight[i],weight[-1] = weight[-1],weight[i]
+
+    predicate = as_predicate(predicate)
+    k = predicate.k
+    ktries = [[get_trie(predicate, pat, i) for pat in pattern] for i in range(k)]
 
     weight = product(*(range(pat + 1) for pat in pattern))
     zero_weights = [w for w in weight if family(w) == 0]
-    return find_obstruction(pattern, zero_weights, ktries)
+    instrumentation.count('obstruction_searches')
+    result, zero_weights = propagate(pattern, zero_weights, ktries)
+    if result is None and CDCL_FALLBACK:
+        result = cdcl_obstruction(predicate, pattern, zero_weights, ktries[k - 1])
+    return result
+
+# If unit propagation is inconclusive, fall back to a SAT solver (requires pysat).
+# This is off by default, as the tables record what unit propagation is able to show.
+CDCL_FALLBACK = False
+
+# The fallback gives up (returning None) after adding this many clauses
+CDCL_MAX_CLAUSES = 10**4
+
+# The SAT solvers of the fallback are kept per (predicate, pattern), at most CDCL_SOLVERS of them
+CDCL_SOLVERS = 2**6
+cdcl_solvers = OrderedDict()
+
+def get_solver(predicate: Predicate, pattern: list[int]):
+    """
+    Returns the SAT solver of the fallback for predicate and pattern, together with
+    a map from weights to the literal "f(weight) = 1".
+
+    The clauses added to the solver only depend on predicate and pattern, the
+    function values given by a family are passed as assumptions. So the solver (with
+    everything it has learnt) is reused by the families using the same predicate and
+    pattern. Different patterns (like the (c, d) splits of ADA-free) are functions with
+    no variables in common, so they get different solvers, and share nothing.
+    """
+    from pysat.solvers import Glucose3
+    from itertools import product
+
+    key = (predicate.k, predicate.bitmask, tuple(pattern))
+    if key in cdcl_solvers:
+        cdcl_solvers.move_to_end(key)
+        return cdcl_solvers[key]
+
+    # f is folded, so f(weight) and f(pattern - weight) share a variable
+    literals = {}
+    for weight in product(*(range(pat + 1) for pat in pattern)):
+        if weight not in literals:
+            nweight = tuple(p - w for p, w in zip(pattern, weight))
+            var = len(literals) // 2 + 1
+            literals[weight] = var
+            literals[nweight] = -var
+
+    cdcl_solvers[key] = entry = Glucose3(), literals
+    if len(cdcl_solvers) > CDCL_SOLVERS:
+        evicted, literals = cdcl_solvers.popitem(last=False)[1]
+        evicted.delete()
+    return entry
+
+def find_zero_matrix(zero_weights: set[tuple[int]], tries: list[Trie], k: int) -> list[tuple[int]] | None:
+    """
+    Find the row weights of a matrix (with columns in the predicate of tries)
+    where f is 0 on every row, or return None if there is none.
+    """
+    from itertools import product
+    from operator import add, getitem
+
+    children = [trie.children for trie in tries]
+    keys = [trie.keys for trie in tries]
+    DFS = [(tuple(trie.root for trie in tries), ())]
+    while DFS:
+        nodes, rows = DFS.pop()
+        for weight in product(*map(getitem, keys, nodes)):
+            if weight in zero_weights:
+                if len(rows) == k - 1:
+                    return list(rows + (weight,))
+                DFS.append((tuple(map(getitem, children, map(add, nodes, weight))), rows + (weight,)))
+    return None
+
+def cdcl_obstruction(predicate: Predicate, pattern: list[int], zero_weights: set[tuple[int]], tries: list[Trie]) -> bool | None:
+    """
+    Decide if there is an obstruction for every function f with f = 0 on zero_weights,
+    using an incremental SAT solver.
+
+    The clauses (f is 1 on some row of each matrix) are generated lazily: the solver
+    proposes a function f, and if some matrix has f = 0 on every row, the clause of that
+    matrix is added and the solver is asked again. Only clauses violated by a proposed
+    function are ever generated, instead of the full SAT instance. However, the matrix
+    is searched for in the full tries (see find_zero_matrix), not only below the states
+    left pending by unit propagation, so every proposal walks again through the part of
+    the search unit propagation already did.
+    """
+    try:
+        import pysat
+    except ModuleNotFoundError:
+        print('Warning: Module pysat not found. Unable to use the SAT solver fallback.')
+        return None
+
+    solver, literals = get_solver(predicate, pattern)
+    assumptions = [-literals[weight] for weight in zero_weights]
+    for _ in range(CDCL_MAX_CLAUSES):
+        instrumentation.count('sat_calls')
+        if not solver.solve(assumptions=assumptions):
+            # No function of the family is a polymorphism
+            return True
+
+        # Variables the solver has not seen yet are missing from the model. Taking f to be 0
+        # on both weights of such a variable only makes finding a matrix easier, so this is safe.
+        model = set(solver.get_model())
+        zeros = {weight for weight, literal in literals.items() if literal not in model}
+        rows = find_zero_matrix(zeros, tries, predicate.k)
+        if rows is None:
+            # f is a polymorphism
+            return False
+
+        instrumentation.count('cdcl_clauses')
+        solver.add_clause(sorted({literals[weight] for weight in rows}))
+
+    return None
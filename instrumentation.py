@@ -0,0 +1,137 @@
+from collections import Counter
+from collections.abc import Callable
+import functools
+import sys
+import time
+
+"""
+    Instrumentation of the verification steps.
+
+    Every verify_* function is wrapped by @instrumented, which records its wall time,
+    CPU time, peak RSS, tracemalloc peak (if TRACEMALLOC is enabled) and the counters
+    incremented during the call (predicates checked, SAT calls, LP solves, ...).
+    The peak RSS is that of the calling process. For the worker processes only the
+    largest peak of any of them is known (see children_peak_rss_mb), so the memory
+    used by a parallel run is under-reported.
+    The records are collected in REPORTS (main.py includes them in its JSON summary).
+
+    Counters are incremented anywhere in the code with count(name), and maxima
+    (like the largest frontier of a search) are recorded with peak(name, value).
+"""
+
+# Tracing memory allocations with tracemalloc slows Python down a lot, so it is opt-in
+TRACEMALLOC = False
+
+COUNTERS = Counter()
+PEAKS = {}
+REPORTS = []
+
+def count(name: str, n: int = 1):
+    COUNTERS[name] += n
+
+def peak(name: str, value: int):
+    if value > PEAKS.get(name, value - 1):
+        PEAKS[name] = value
+
+def reset_peak_rss() -> bool:
+    """
+        Reset the peak RSS of this process (only supported on Linux).
+        Returns True if successful.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb() -> float | None:
+    """
+        Peak resident set size of this process in MB.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ModuleNotFoundError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB elsewhere
+    return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 1024
+
+def children_peak_rss_mb() -> float | None:
+    """
+        Largest peak resident set size in MB of the child processes (like the pools of
+        --predicate-processes, --search-processes and the sharded generation of the
+        representatives) that have exited so far. This cannot be reset, so it covers
+        all children since the start of this process, and not their total.
+    """
+    try:
+        import resource
+    except ModuleNotFoundError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 1024
+
+def instrumented(function: Callable) -> Callable:
+    """
+        Decorator recording a report in REPORTS for every call of function.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        import tracemalloc
+        if TRACEMALLOC:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+        peak_rss_reset = reset_peak_rss()
+        counters_before = COUNTERS.copy()
+        peaks_before = PEAKS.copy()
+        PEAKS.clear()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            report = {
+                'function': '%s.%s' % (function.__module__, function.__name__),
+                'args': [repr(arg) for arg in args],
+                'result': repr(result),
+                'wall_time': time.perf_counter() - wall_start,
+                'cpu_time': time.process_time() - cpu_start,
+                'peak_rss_mb': peak_rss_mb(),
+                # If the peak could not be reset, it is the peak over the lifetime of the process
+                'peak_rss_is_lifetime': not peak_rss_reset,
+                'children_peak_rss_mb': children_peak_rss_mb(),
+                'tracemalloc_peak_mb': tracemalloc.get_traced_memory()[1] / 2**20 if TRACEMALLOC else None,
+                'counters': dict(COUNTERS - counters_before),
+                'peaks': dict(PEAKS),
+            }
+            REPORTS.append(report)
+            for name, value in peaks_before.items():
+                peak(name, value)
+    return wrapper
+
+def format_report(report: dict) -> str:
+    line = '%s(%s): wall %.2f s, cpu %.2f s' % (report['function'], ', '.join(report['args']), report['wall_time'], report['cpu_time'])
+    if report['peak_rss_mb'] is not None:
+        line += ', peak RSS %.0f MB' % report['peak_rss_mb']
+    if report.get('children_peak_rss_mb'):
+        line += ' (children %.0f MB)' % report['children_peak_rss_mb']
+    if report['tracemalloc_peak_mb'] is not None:
+        line += ', tracemalloc peak %.0f MB' % report['tracemalloc_peak_mb']
+    for name, value in sorted(report['counters'].items()):
+        line += ', %s %d' % (name, value)
+    for name, value in sorted(report.get('peaks', {}).items()):
+        line += ', max %s %d' % (name, value)
+    return line
@@ -1,54 +1,238 @@
 import verification
 import verification_promise
+import instrumentation
+import cache
+import checkpoint
+import hardness_conditions.parallel
+import parallel_checks
+import argparse
+import json
+import sys
+import time
+import traceback
 
-for k in 2,3,4,5:
+"""
+    Runs the verification of the tables.
 
+    Each verification step for each k is an independent job. The jobs are run on
+    a pool of processes, respecting their dependencies (for example the steps using
+    the bitsets of verification.get_bitsets wait until the bitsets have been built
+    and stored in the on-disk cache, instead of building them once per process).
+
+    Successful steps, and the per-predicate results of the long steps, are checkpointed
+    (see checkpoint.py), so an interrupted run can be continued with --resume.
+
+    Run `python main.py --help` for the available options.
+"""
+
+# Steps that build intermediate structures used by several verification steps.
+# These are stored in the on-disk cache (see cache.py), from where the other steps load them.
+PREPARE_STEPS = {
+    'bitsets': verification.get_bitsets,
+    'promise_bitsets': verification_promise.get_bitsets,
+}
+
+# (name, function, description, dependencies)
+STEPS = [
     # Verification of tables corresponding to tractability and hardness of fiPCSP(A, OR)
-    print('Verifying coverage', flush=True)
-    result_coverage = verification.verify_coverage(k)
-    print('Verifying tractability', flush=True)
-    result_tractability = verification.verify_tractability(k)
-    print('Verifying hardness', flush=True)
-    result_hardness = verification.verify_hardness(k)
-    print('Verifying block symmetries', flush=True)
-    result_block_sym = verification.verify_block_sym(k)
-    print('Verifying that representatives used is lexographically the smallest possible', flush=True)
-    result_representative_lexographically_smallest = verification.verify_representative_lexographically_smallest(k)
-    print('Verifying counts of tractable/unknown/hard representatives', flush=True)
-    result_counts = verification.verify_counts(k)
+    ('coverage', verification.verify_coverage, 'coverage', ['bitsets']),
+    ('tractability', verification.verify_tractability, 'tractability', []),
+    ('hardness', verification.verify_hardness, 'hardness', []),
+    ('block_sym', verification.verify_block_sym, 'block symmetry', []),
+    ('lexicographic', verification.verify_representative_lexographically_smallest, 'lexographically smallest possible representatives', []),
+    ('counts', verification.verify_counts, 'counts of tractable/unknown/hard representatives', ['bitsets']),
+    ('counts_burnside', verification.verify_counts_burnside, 'counts of tractable/unknown/hard representatives using Burnside\'s lemma', ['bitsets']),
 
     # Verification of tables correponding to promise-useful/uselessness
-    print('Verifying coverage for promise', flush=True)
-    result_promise_coverage = verification_promise.verify_coverage(k)
-    print('Verifying usefulness for promise', flush=True)
-    result_promise_usefulness = verification_promise.verify_promise_usefulness(k)
-    print('Verifying uselessness for promise', flush=True)
-    result_promise_uselessness = verification_promise.verify_promise_uselessness(k)
-    print('Verifying that representatives used for promise is lexiographically the smallest possible', flush=True)
-    result_promise_representative_lexographically_smallest = verification_promise.verify_representative_lexographically_smallest(k)
-    print('Verifying counts of promise-useful/unknown/useless representatives', flush=True)
-    result_promise_counts = verification_promise.verify_counts(k)
-
-    print('-----------------------------------------------------------------------')
-    print()
-    print('Summary of results for k = %d:' % k)
-    print('Verification of coverage:', ['FAILED', 'SUCCESS'][result_coverage])
-    print('Verification of tractability:', ['FAILED', 'SUCCESS'][result_tractability])
-    print('Verification of hardness:', ['FAILED', 'SUCCESS'][result_hardness])
-    print('Verification of block symmetry:', ['FAILED', 'SUCCESS'][result_block_sym])
-    print('Verification of lexographically smallest possible representatives:', ['FAILED', 'SUCCESS'][result_representative_lexographically_smallest])
-    print('Verification of counts of tractable/unknown/hard representatives:', ['FAILED', 'SUCCESS'][result_counts])
-    
-    print('Verification of coverage for promise:', ['FAILED', 'SUCCESS'][result_promise_coverage])
-    print('Verification of promise usefulness:', ['FAILED', 'SUCCESS'][result_promise_usefulness])
-    print('Verification of promise uselessness:', ['FAILED', 'SUCCESS'][result_promise_uselessness])
-    print('Verification of lexographically smallest possible representatives for promise:', ['FAILED', 'SUCCESS'][result_promise_representative_lexographically_smallest])
-    print('Verification of counts of promise-useful/unknown/useless representatives:', ['FAILED', 'SUCCESS'][result_promise_counts])
-    print()
-    print('-----------------------------------------------------------------------')
-
-
-    if k == 4:
-        print('WARNING: Next verification is k = 5. This is both slow and requires a significant amount of RAM. Using PyPy is recommended.')
-    input('Press enter to continue')
+    ('promise_coverage', verification_promise.verify_coverage, 'coverage for promise', ['promise_bitsets']),
+    ('promise_usefulness', verification_promise.verify_promise_usefulness, 'promise usefulness', ['bitsets']),
+    ('promise_uselessness', verification_promise.verify_promise_uselessness, 'promise uselessness', ['bitsets']),
+    ('promise_lexicographic', verification_promise.verify_representative_lexographically_smallest, 'lexographically smallest possible representatives for promise', []),
+    ('promise_counts', verification_promise.verify_counts, 'counts of promise-useful/unknown/useless representatives', ['promise_bitsets']),
+    ('promise_counts_burnside', verification_promise.verify_counts_burnside, 'counts of promise-useful/unknown/useless representatives using Burnside\'s lemma', ['promise_bitsets']),
+]
+
+STEP_FUNCTIONS = {name: function for name, function, description, dependencies in STEPS}
+STEP_DESCRIPTIONS = {name: description for name, function, description, dependencies in STEPS}
+STEP_DEPENDENCIES = {name: dependencies for name, function, description, dependencies in STEPS}
+
+def run_step(step: str, k: int, tracemalloc: bool = False, resume: bool = False, search_processes: int = 1, predicate_processes: int = 1, timeout: float | None = None, representatives_processes: int = 1) -> dict:
+    """
+        Run a single step for a given k, catching any failure.
+        Returns a dict describing the result, including the instrumentation
+        reports (see instrumentation.py) of the verify_* functions called.
+    """
+    instrumentation.TRACEMALLOC = tracemalloc
+    cache.RESUME = resume
+    hardness_conditions.parallel.PROCESSES = search_processes
+    parallel_checks.PROCESSES = predicate_processes
+    parallel_checks.TIMEOUT = timeout
+    verification.REPRESENTATIVES_PROCESSES = representatives_processes
+    verification_promise.REPRESENTATIVES_PROCESSES = representatives_processes
+    num_reports = len(instrumentation.REPORTS)
+    start = time.time()
+    error = None
+    try:
+        if step in PREPARE_STEPS:
+            PREPARE_STEPS[step](k)
+            success = True
+        else:
+            success = bool(STEP_FUNCTIONS[step](k))
+    except Exception:
+        success = False
+        error = traceback.format_exc()
+    finally:
+        hardness_conditions.parallel.shutdown()
+    return {
+        'k': k,
+        'step': step,
+        'result': ['FAILED', 'SUCCESS'][success],
+        'wall_time': time.time() - start,
+        'error': error,
+        'instrumentation': instrumentation.REPORTS[num_reports:],
+    }
+
+def get_jobs(ks: list[int], steps: list[str]) -> dict[tuple[str, int], list[tuple[str, int]]]:
+    """
+        Returns all jobs (step, k) needed to run the given steps, mapped to their dependencies.
+    """
+    jobs = {}
+    for k in ks:
+        for step in steps:
+            dependencies = [(dependency, k) for dependency in STEP_DEPENDENCIES[step]]
+            jobs[step, k] = dependencies
+            for dependency in dependencies:
+                jobs[dependency] = []
+    return jobs
+
+def get_step_key(job: tuple[str, int]) -> str:
+    """
+        The key of a job in the checkpoint of completed steps, depending on the contents of the tables.
+    """
+    step, k = job
+    return checkpoint.step_key(step, k, verification.get_table_filenames(k) + verification_promise.get_table_filenames(k))
+
+def run_jobs(jobs: dict[tuple[str, int], list[tuple[str, int]]], processes: int, tracemalloc: bool = False, resume: bool = False, search_processes: int = 1, predicate_processes: int = 1, timeout: float | None = None, representatives_processes: int = 1) -> dict[tuple[str, int], dict]:
+    """
+        Run all jobs, starting a job as soon as all of its dependencies are done.
+        A job whose dependency failed is marked as failed without being run.
+        If resume is set, jobs that succeeded in an earlier run are not run again.
+    """
+    completed = checkpoint.load_completed_steps() if resume else {}
+
+    results = {}
+    def report(job, result):
+        results[job] = result
+        if result['result'] == 'SUCCESS' and not result.get('resumed'):
+            checkpoint.record_completed_step(get_step_key(job), result)
+        if result.get('resumed'):
+            print('Skipped %s for k = %d: %s in an earlier run (%.1f s)' % (job[0], job[1], result['result'], result['wall_time']), flush=True)
+            return
+        print('Finished %s for k = %d: %s (%.1f s)' % (job[0], job[1], result['result'], result['wall_time']), flush=True)
+        for report in result['instrumentation']:
+            print('    ' + instrumentation.format_report(report), flush=True)
+        if result['error']:
+            print(result['error'], flush=True)
+
+    def ready_jobs():
+        out = []
+        for job, dependencies in jobs.items():
+            if job in results or job in running:
+                continue
+            if all(dependency in results for dependency in dependencies):
+                out.append(job)
+        return out
+
+    def dependency_failed(job):
+        return any(results[dependency]['result'] == 'FAILED' for dependency in jobs[job])
+
+    def completed_result(job):
+        result = completed.get(get_step_key(job))
+        if result is None or result['result'] != 'SUCCESS':
+            return None
+        return dict(result, resumed=True)
+
+    def failed_dependency_result(job):
+        return {'k': job[1], 'step': job[0], 'result': 'FAILED', 'wall_time': 0.0, 'error': 'A dependency failed', 'instrumentation': []}
+
+    running = {}
+    if processes <= 1:
+        # Run everything in this process, in order
+        while len(results) < len(jobs):
+            for job in ready_jobs():
+                if dependency_failed(job):
+                    report(job, failed_dependency_result(job))
+                else:
+                    report(job, completed_result(job) or run_step(*job, tracemalloc, resume, search_processes, predicate_processes, timeout, representatives_processes))
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    with ProcessPoolExecutor(processes) as executor:
+        while len(results) < len(jobs):
+            for job in ready_jobs():
+                if dependency_failed(job):
+                    report(job, failed_dependency_result(job))
+                elif completed_result(job):
+                    report(job, completed_result(job))
+                else:
+                    print('Starting %s for k = %d' % job, flush=True)
+                    running[job] = executor.submit(run_step, *job, tracemalloc, resume, search_processes, predicate_processes, timeout, representatives_processes)
+
+            if not running:
+                continue
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for job, future in list(running.items()):
+                if future in done:
+                    del running[job]
+                    report(job, future.result())
+    return results
+
+def print_summary(ks: list[int], steps: list[str], results: dict[tuple[str, int], dict]):
+    for k in ks:
+        print('-----------------------------------------------------------------------')
+        print()
+        print('Summary of results for k = %d:' % k)
+        for step in steps:
+            print('Verification of %s:' % STEP_DESCRIPTIONS[step], results[step, k]['result'])
+        print()
+        print('-----------------------------------------------------------------------')
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Verify the tables found in ./tables.')
+    parser.add_argument('-k', type=int, nargs='+', default=[2, 3, 4, 5], help='the values of k to verify (default: 2 3 4 5)')
+    parser.add_argument('--steps', nargs='+', choices=[name for name, function, description, dependencies in STEPS], default=[name for name, function, description, dependencies in STEPS], help='the steps to run (default: all)')
+    parser.add_argument('--processes', type=int, default=1, help='number of steps run in parallel, each in its own process (default: 1, every step for k = 5 can use several GB of RAM)')
+    parser.add_argument('--json', metavar='PATH', help='write a JSON summary of the results (including timings, memory usage and counters of every step) to PATH (- for stdout)')
+    parser.add_argument('--tracemalloc', action='store_true', help='also record the peak memory allocated by Python of every step (slow)')
+    parser.add_argument('--resume', action='store_true', help='resume an interrupted run: skip the steps that succeeded before, and reuse the checkpointed per-predicate results and partially built structures')
+    parser.add_argument('--search-processes', type=int, default=1, help='number of processes running the obstruction searches of a hardness sub-condition concurrently, per step (default: 1)')
+    parser.add_argument('--predicate-processes', type=int, default=1, help='number of processes checking the predicates of the tractability, hardness and block symmetry steps, per step (default: 1)')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS', help='fail a predicate of the tractability, hardness and block symmetry steps if checking it takes longer than this, checking every predicate in a worker process (default: no limit)')
+    parser.add_argument('--representatives-processes', type=int, default=1, help='number of processes generating the representatives by testing every predicate to be the smallest in its orbit, instead of enumerating the orbits in a single process (default: 1)')
+    args = parser.parse_args(argv)
+
+    # If the JSON summary goes to stdout, everything else goes to stderr
+    import contextlib
+    with contextlib.redirect_stdout(sys.stderr if args.json == '-' else sys.stdout):
+        if 5 in args.k:
+            print('WARNING: Verification of k = 5 is both slow and requires a significant amount of RAM. Using PyPy is recommended.', flush=True)
+
+        results = run_jobs(get_jobs(args.k, args.steps), args.processes, args.tracemalloc, args.resume, args.search_processes, args.predicate_processes, args.timeout, args.representatives_processes)
+        print_summary(args.k, args.steps, results)
+
+    if args.json:
+        summary = {
+            'success': all(result['result'] == 'SUCCESS' for result in results.values()),
+            'results': [results[job] for job in sorted(results, key=lambda job: (job[1], job[0]))],
+        }
+        if args.json == '-':
+            json.dump(summary, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+    return 0 if all(result['result'] == 'SUCCESS' for result in results.values()) else 1
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+from checkpoint import Checkpoint
+from predicate import Predicate
+from collections.abc import Callable, Iterator
+import hardness_conditions.parallel
+import instrumentation
+import multiprocessing
+import os
+import signal
+import time
+
+"""
+    Running a check (like is_hard) on many predicates, on a pool of processes.
+
+    The predicates are independent, so they are split into chunks of CHUNK_SIZE
+    predicates that are checked by PROCESSES processes. The results are returned in
+    the order of the predicates, whatever order the chunks finish in. Results are
+    recorded in the checkpoint as soon as their chunk is done, and predicates with a
+    recorded result are not checked again (see checkpoint.py).
+
+    With a TIMEOUT (in seconds), a check running for longer than that is abandoned and
+    its result is None. Timeouts are not recorded in the checkpoint, so a resumed
+    run tries them again. To be able to abandon any check (including LP and SAT solver
+    calls), every predicate is then checked on its own in one of PROCESSES worker
+    processes (also if PROCESSES is 1). A worker exceeding the timeout is killed,
+    together with the processes it started (like its search processes, see
+    hardness_conditions/parallel.py), and replaced by a new one. As the killed worker
+    is discarded, no half updated cache of it is ever used again.
+
+    With search processes as well, every process checking predicates has its own pool
+    of search processes, which is shut down after each chunk.
+"""
+
+# Number of processes checking predicates, 1 checks them one by one in this process (without a TIMEOUT)
+PROCESSES = 1
+
+# Number of predicates sent to a process at once
+CHUNK_SIZE = 4
+
+# Maximum time in seconds spent on a single predicate, None for no limit
+TIMEOUT = None
+
+def check_chunk(check: Callable[[Predicate], bool], chunk: list[Predicate]) -> tuple[list[bool], dict, dict]:
+    """
+        Check a chunk of predicates in a worker. Also returns the counters and peaks of
+        the instrumentation, so they can be added to those of the main process.
+    """
+    instrumentation.COUNTERS.clear()
+    instrumentation.PEAKS.clear()
+    try:
+        results = [bool(check(predicate)) for predicate in chunk]
+    finally:
+        # A pool left running would keep the worker from exiting
+        hardness_conditions.parallel.shutdown()
+    return results, dict(instrumentation.COUNTERS), dict(instrumentation.PEAKS)
+
+def worker_loop(connection, check: Callable[[Predicate], bool]):
+    """
+        Check the predicates received on connection one at a time, until None is received.
+    """
+    if hasattr(os, 'setpgrp'):
+        # Own process group, so that the processes started by this worker can be killed with it
+        os.setpgrp()
+    while True:
+        predicate = connection.recv()
+        if predicate is None:
+            return
+        try:
+            connection.send(check_chunk(check, [predicate]))
+        except Exception as e:
+            connection.send(e)
+
+class Worker:
+    """
+        A process running worker_loop, checking at most one predicate at a time.
+    """
+    def __init__(self, check: Callable[[Predicate], bool]):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=worker_loop, args=(child_connection, check))
+        self.process.start()
+        child_connection.close()
+        # Index of the predicate being checked and when it times out, if any
+        self.index = None
+        self.deadline = None
+
+    def submit(self, index: int, predicate: Predicate, timeout: float):
+        self.index = index
+        self.deadline = time.monotonic() + timeout
+        self.connection.send(predicate)
+
+    def kill(self):
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join()
+        self.connection.close()
+
+def check_with_timeout(predicates: list[Predicate], todo: list[int], check: Callable[[Predicate], bool], timeout: float, processes: int) -> Iterator[tuple[int, bool | None]]:
+    """
+        Yields (i, check(predicates[i])) for every i in todo, in the order the checks finish,
+        where a check taking more than timeout seconds gives None.
+    """
+    from multiprocessing.connection import wait
+    workers = []
+    interrupted = False
+    try:
+        workers = [Worker(check) for _ in range(min(max(1, processes), len(todo)))]
+        queue = list(reversed(todo))
+        while queue or any(worker.index is not None for worker in workers):
+            for worker in workers:
+                if worker.index is None and queue:
+                    i = queue.pop()
+                    worker.submit(i, predicates[i], timeout)
+
+            busy = [worker for worker in workers if worker.index is not None]
+            ready = wait([worker.connection for worker in busy], max(0, min(worker.deadline for worker in busy) - time.monotonic()))
+            for n, worker in enumerate(workers):
+                if worker.index is None:
+                    continue
+                if worker.connection in ready:
+                    try:
+                        message = worker.connection.recv()
+                    except EOFError:
+                        raise RuntimeError('Worker checking predicate %d exited unexpectedly' % worker.index)
+                    if isinstance(message, Exception):
+                        raise message
+                    [result], counters, peaks = message
+                    instrumentation.COUNTERS.update(counters)
+                    for name, value in peaks.items():
+                        instrumentation.peak(name, value)
+                    i, worker.index = worker.index, None
+                    yield i, result
+                elif time.monotonic() >= worker.deadline:
+                    instrumentation.count('timeouts')
+                    i = worker.index
+                    worker.kill()
+                    workers[n] = Worker(check)
+                    yield i, None
+    except BaseException:
+        interrupted = True
+        raise
+    finally:
+        for worker in workers:
+            # Do not wait for running checks if this was interrupted
+            if interrupted or worker.index is not None:
+                worker.kill()
+            else:
+                worker.stop()
+
+def check_predicates(predicates: list[Predicate], check: Callable[[Predicate], bool], checkpoint: Checkpoint) -> list[bool | None]:
+    """
+        Returns [check(predicate) for predicate in predicates], where a check that timed
+        out gives None, using and updating the results recorded in checkpoint.
+    """
+    results = [checkpoint.lookup(predicate) for predicate in predicates]
+    todo = [i for i, result in enumerate(results) if result is None]
+
+    if TIMEOUT is not None:
+        for i, result in check_with_timeout(predicates, todo, check, TIMEOUT, PROCESSES):
+            results[i] = result
+            if result is not None:
+                checkpoint.store(predicates[i], result)
+        return results
+
+    if PROCESSES <= 1:
+        try:
+            for i in todo:
+                results[i] = bool(check(predicates[i]))
+                checkpoint.store(predicates[i], results[i])
+        finally:
+            # Stop the search processes within the step, so that they are counted in its instrumentation
+            hardness_conditions.parallel.shutdown()
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    executor = ProcessPoolExecutor(PROCESSES)
+    try:
+        futures = {}
+        for start in range(0, len(todo), CHUNK_SIZE):
+            indices = todo[start:start + CHUNK_SIZE]
+            futures[executor.submit(check_chunk, check, [predicates[i] for i in indices])] = indices
+
+        for future in as_completed(futures):
+            chunk_results, counters, peaks = future.result()
+            instrumentation.COUNTERS.update(counters)
+            for name, value in peaks.items():
+                instrumentation.peak(name, value)
+
+            for i, result in zip(futures[future], chunk_results):
+                results[i] = result
+                checkpoint.store(predicates[i], result)
+    finally:
+        # Do not wait for the remaining chunks if this was interrupted
+        executor.shutdown(cancel_futures=True)
+    return results
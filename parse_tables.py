@@ -1,6 +1,15 @@
+from predicate import Predicate
+from array import array
+import os
+import sys
+
 """
 Contains a parser of the files found in ./tables.
 See tables/README.md for more information.
+
+The .txt files are the (human-editable) source of truth. For fast loading,
+each table is also converted to a binary format with the wildcards already
+expanded (see write_binary), which is stored in the on-disk cache.
 """
 
 def all_bitstrings(k: int) -> list[str]:
@@ -12,10 +21,10 @@ def all_bitstrings(k: int) -> list[str]:
         out.append(bin(i + 2**k)[3:])
     return out
 
-def read(FILENAME: str) -> list[list[str]]:
+def read_text(FILENAME: str) -> tuple[int, list[list[str]]]:
     """
-        Read a table file and return all of its predicates
-        as a list of lists of strings.
+        Read a table file (in the .txt format) and return k together with
+        all of its predicates as a list of lists of strings.
     """
     with open(FILENAME, 'r') as f:
         # Mimic built in input function
@@ -38,4 +47,85 @@ def read(FILENAME: str) -> list[list[str]]:
             predicate.sort()
             predicates.append(predicate)
     
-    return predicates
+    return k, predicates
+
+MAGIC = b'PREDTAB1'
+
+def truth_table_typecode(k: int) -> str:
+    """
+        The array typecode used to store truth tables of predicates of arity k.
+    """
+    assert 2**k <= 64
+    return 'I' if 2**k <= 32 else 'Q'
+
+def write_binary(FILENAME: str, k: int, truth_tables: list[int]):
+    """
+        Write a table in the binary format: the magic bytes MAGIC, k and the number of
+        predicates as little endian uint32, followed by the truth tables of the predicates
+        as little endian uint32 (uint64 for k = 6).
+    """
+    A = array(truth_table_typecode(k), truth_tables)
+    if sys.byteorder == 'big':
+        A.byteswap()
+    with open(FILENAME, 'wb') as f:
+        f.write(MAGIC)
+        f.write(k.to_bytes(4, 'little'))
+        f.write(len(A).to_bytes(4, 'little'))
+        A.tofile(f)
+
+def read_binary(FILENAME: str) -> tuple[int, array]:
+    """
+        Read a table in the binary format, returning k and an array of truth tables.
+    """
+    with open(FILENAME, 'rb') as f:
+        if f.read(8) != MAGIC:
+            raise ValueError('Not a binary table file')
+        k = int.from_bytes(f.read(4), 'little')
+        n = int.from_bytes(f.read(4), 'little')
+        A = array(truth_table_typecode(k))
+        A.fromfile(f, n)
+    if sys.byteorder == 'big':
+        A.byteswap()
+    return k, A
+
+def convert(FILENAME: str, BINARY_FILENAME: str):
+    """
+        Convert a table file from the .txt format to the binary format.
+    """
+    k, predicates = read_text(FILENAME)
+    write_binary(BINARY_FILENAME, k, [Predicate.from_strings(predicate, k).bitmask for predicate in predicates])
+
+def read_bitmasks(FILENAME: str) -> tuple[int, array]:
+    """
+        Read a table file (in the .txt format) and return k and the truth tables of
+        its predicates as an array of integers.
+        This uses the binary version of the table found in the cache (creating it if needed).
+    """
+    import cache
+    name = os.path.splitext(os.path.basename(FILENAME))[0]
+    path = cache.cached_file('table_' + name, [FILENAME], lambda path: convert(FILENAME, path))
+    if path is not None:
+        try:
+            return read_binary(path)
+        except (EOFError, ValueError) as e:
+            # It is rebuilt the next time it is needed
+            print('Warning: Cached table %s is corrupt (%s). Removing it and reading %s instead.' % (path, e, FILENAME))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    k, predicates = read_text(FILENAME)
+    return k, array(truth_table_typecode(k), (Predicate.from_strings(predicate, k).bitmask for predicate in predicates))
+
+def read(FILENAME: str) -> list[Predicate]:
+    """
+        Read a table file and return all of its predicates.
+        Each predicate also behaves as a sorted list of bitstrings.
+    """
+    k, truth_tables = read_bitmasks(FILENAME)
+    return [Predicate(k, p) for p in truth_tables]
+
+if __name__ == '__main__':
+    # Usage: python parse_tables.py table.txt table.bin
+    convert(sys.argv[1], sys.argv[2])
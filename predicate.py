@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+"""
+    A compact representation of a predicate of arity k.
+
+    A predicate is stored as its truth table, i.e. a bitmask where bit a is set iff
+    the assignment a (read as a k-bit binary number) satisfies the predicate.
+    Other views of the predicate (used by the different checks) are computed lazily
+    and cached, so each predicate is decoded once per verification run.
+
+    For backwards compatibility a Predicate also behaves like the sorted list of
+    bitstrings it used to be represented by, e.g. predicate[0] and iteration
+    give bitstrings, and the checks accept either representation.
+"""
+
+class Predicate:
+    __slots__ = ('k', 'bitmask', '_assignments', '_tuples', '_strings')
+
+    def __init__(self, k: int, bitmask: int):
+        assert 0 <= bitmask < 2**(2**k)
+        self.k = k
+        self.bitmask = bitmask
+        self._assignments = None
+        self._tuples = None
+        self._strings = None
+
+    @classmethod
+    def from_strings(cls, predicate: list[str], k: int | None = None) -> Predicate:
+        if k is None:
+            # The arity of an empty list of bitstrings is unknown, use 0
+            k = len(predicate[0]) if predicate else 0
+        bitmask = 0
+        for assign in predicate:
+            assert len(assign) == k
+            bitmask |= 1 << int(assign, 2)
+        return cls(k, bitmask)
+
+    @property
+    def assignments(self) -> list[int]:
+        """
+            The satisfying assignments as integers, in increasing order.
+        """
+        if self._assignments is None:
+            self._assignments = [a for a in range(2**self.k) if (self.bitmask >> a) & 1]
+        return self._assignments
+
+    @property
+    def tuples(self) -> list[tuple[int]]:
+        """
+            The satisfying assignments as tuples of k bits (most significant bit first),
+            in increasing order.
+        """
+        if self._tuples is None:
+            k = self.k
+            self._tuples = [tuple((a >> (k - 1 - i)) & 1 for i in range(k)) for a in self.assignments]
+        return self._tuples
+
+    @property
+    def strings(self) -> list[str]:
+        """
+            The satisfying assignments as bitstrings of length k, in increasing order.
+        """
+        if self._strings is None:
+            k = self.k
+            self._strings = [bin(a + 2**k)[3:] for a in self.assignments]
+        return self._strings
+
+    def __contains__(self, assign: int | str | tuple[int]) -> bool:
+        if isinstance(assign, str):
+            assign = int(assign, 2)
+        elif isinstance(assign, tuple):
+            a = 0
+            for bit in assign:
+                a = 2 * a + bit
+            assign = a
+        return (self.bitmask >> assign) & 1 == 1
+
+    def __len__(self) -> int:
+        return self.bitmask.bit_count()
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __getitem__(self, i: int) -> str:
+        return self.strings[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Predicate):
+            return self.k == other.k and self.bitmask == other.bitmask
+        if isinstance(other, list):
+            return self.strings == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.k, self.bitmask))
+
+    def __repr__(self) -> str:
+        return 'Predicate(%d, %s)' % (self.k, bin(self.bitmask))
+
+def as_predicate(predicate: Predicate | list[str]) -> Predicate:
+    """
+        Convert a list of bitstrings to a Predicate (Predicates are returned as is).
+    """
+    if isinstance(predicate, Predicate):
+        return predicate
+    return Predicate.from_strings(predicate)
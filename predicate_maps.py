@@ -0,0 +1,200 @@
+import parse_tables
+from array import array
+from collections.abc import Callable, Iterator
+from functools import lru_cache as memoization
+
+"""
+    Maps acting on predicates given as bitmasks (bit a is set iff assignment a is in the predicate).
+
+    A map is given by where it sends each assignment, i.e. a list mapping of length 2^k.
+    Applying a map to a predicate bitmask p gives the bitmask with bit mapping[a] set
+    for every a in p.
+
+    Applying a map bit by bit is slow, so maps are compiled into lookup tables.
+    The bitmask is split into chunks of CHUNK bits, and each chunk is looked up in a
+    table giving the image of that chunk. One map application for k = 5 is then
+    4 table lookups and 3 ORs.
+
+    A predicate is a representative of its orbit iff it is the smallest bitmask
+    in its orbit. This can be tested independently for every predicate, which is
+    used to find the representatives in parallel.
+"""
+
+CHUNK = 8
+
+@memoization
+def permutation_maps(k: int) -> list[list[int]]:
+    """
+        All maps on assignments corresponding to permutations of the k coordinates.
+    """
+    import itertools
+    maps = []
+    for permutation in itertools.permutations(range(k)):
+        mapping = [0] * 2**k
+        for bitstring in parse_tables.all_bitstrings(k):
+            permuted_bitstring = ''.join(bitstring[i] for i in permutation)
+            mapping[int(bitstring, 2)] = int(permuted_bitstring, 2)
+        maps.append(mapping)
+    return maps
+
+@memoization
+def permutation_xor_maps(k: int) -> list[list[int]]:
+    """
+        All maps on assignments corresponding to permutations of the k coordinates
+        followed by xor with a bitstring of length k.
+    """
+    maps = []
+    seen = set()
+    for permutation_map in permutation_maps(k):
+        for xor_mask in range(2**k):
+            mapping = [a ^ xor_mask for a in permutation_map]
+
+            # Avoid duplicates
+            if tuple(mapping) not in seen:
+                seen.add(tuple(mapping))
+                maps.append(mapping)
+    return maps
+
+@memoization
+def xor_maps(k: int) -> list[list[int]]:
+    """
+        All maps on assignments corresponding to xor with a bitstring of length k.
+    """
+    return [[a ^ xor_mask for a in range(2**k)] for xor_mask in range(2**k)]
+
+def apply_map(p: int, mapping: list[int]) -> int:
+    """
+        Apply mapping to bitmask p, bit by bit.
+    """
+    q = 0
+    for i in range(len(mapping)):
+        q |= ((p >> i) & 1) << mapping[i]
+    return q
+
+def compile_map(mapping: list[int]) -> Callable[[int], int]:
+    """
+        Compile mapping into a function p -> apply_map(p, mapping) based on lookup tables.
+    """
+    n = len(mapping)
+    chunk = min(CHUNK, n)
+    mask = 2**chunk - 1
+
+    tables = []
+    for start in range(0, n, chunk):
+        T = [0] * 2**chunk
+        for x in range(1, 2**chunk):
+            # T[x] = T[x without its lowest bit] | image of lowest bit
+            low = x & -x
+            T[x] = T[x ^ low] | (1 << mapping[start + low.bit_length() - 1])
+        tables.append(T)
+
+    # Unroll the common cases
+    if len(tables) == 1:
+        T0, = tables
+        return lambda p: T0[p]
+    if len(tables) == 2:
+        T0, T1 = tables
+        return lambda p: T0[p & mask] | T1[p >> chunk]
+    if len(tables) == 4:
+        T0, T1, T2, T3 = tables
+        return lambda p: T0[p & mask] | T1[(p >> chunk) & mask] | T2[(p >> 2 * chunk) & mask] | T3[p >> 3 * chunk]
+
+    def apply(p: int) -> int:
+        q = 0
+        for T in tables:
+            q |= T[p & mask]
+            p >>= chunk
+        return q
+    return apply
+
+@memoization
+def compiled_permutation_maps(k: int) -> list[Callable[[int], int]]:
+    return [compile_map(mapping) for mapping in permutation_maps(k)]
+
+@memoization
+def compiled_permutation_xor_maps(k: int) -> list[Callable[[int], int]]:
+    return [compile_map(mapping) for mapping in permutation_xor_maps(k)]
+
+@memoization
+def compiled_xor_maps(k: int) -> list[Callable[[int], int]]:
+    return [compile_map(mapping) for mapping in xor_maps(k)]
+
+@memoization
+def compiled_stabilizer_maps(k: int, assignments: tuple[int, ...]) -> list[Callable[[int], int]]:
+    """
+        The compiled maps of the permutations of the k coordinates that map
+        the set of assignments to itself.
+    """
+    return [compile_map(mapping) for mapping in permutation_maps(k) if {mapping[a] for a in assignments} == set(assignments)]
+
+# Groups acting on predicates, by name
+GROUPS = {
+    'permutation': compiled_permutation_maps,
+    'xor': compiled_xor_maps,
+    'permutation_xor': compiled_permutation_xor_maps,
+}
+
+def orbit(p: int, k: int, group: str) -> set[int]:
+    """
+        The orbit of bitmask p under group (one of the names in GROUPS).
+    """
+    return {apply_map(p) for apply_map in GROUPS[group](k)}
+
+def canonical(p: int, k: int, group: str) -> int:
+    """
+        The lexicographically smallest bitmask in the orbit of bitmask p under group
+        (one of the names in GROUPS).
+    """
+    return min(apply_map(p) for apply_map in GROUPS[group](k))
+
+def is_orbit_minimal(p: int, maps: list[Callable[[int], int]]) -> bool:
+    """
+        Check if p is the smallest bitmask in its orbit.
+    """
+    for apply_map in maps:
+        if apply_map(p) < p:
+            return False
+    return True
+
+def orbit_minimal_shard(shard: tuple[str, int, int, int, int]) -> array:
+    """
+        Find all orbit minimal bitmasks p in range(start, stop, step).
+        Takes a single tuple (group, k, start, stop, step) so it can be used with Pool.imap.
+    """
+    group, k, start, stop, step = shard
+    maps = GROUPS[group](k)
+    return array('I', (p for p in range(start, stop, step) if is_orbit_minimal(p, maps)))
+
+# Number of shards per process, more shards gives better load balancing
+SHARDS_PER_PROCESS = 16
+
+def sharded_orbit_minimal(group: str, k: int, start: int, stop: int, step: int, processes: int, block_size: int) -> Iterator[array]:
+    """
+        Find all orbit minimal bitmasks p in range(start, stop, step), in increasing order,
+        in blocks of block_size.
+
+        The range is split into shards which are handled independently by a pool of processes.
+        Unlike enumerating orbits one by one, this needs no bitset of the predicates already found.
+    """
+    # Predicates are stored as 32 bit integers
+    assert 2**k <= 32
+
+    n = len(range(start, stop, step))
+    num_shards = max(1, min(n, processes * SHARDS_PER_PROCESS))
+    shards = []
+    for i in range(num_shards):
+        lo = start + (n * i // num_shards) * step
+        hi = start + (n * (i + 1) // num_shards) * step
+        shards.append((group, k, lo, hi, step))
+
+    from multiprocessing import Pool
+    block = array('I')
+    with Pool(processes) as pool:
+        # imap returns the results in order
+        for result in pool.imap(orbit_minimal_shard, shards):
+            block.extend(result)
+            while len(block) >= block_size:
+                yield block[:block_size]
+                block = block[block_size:]
+    if block:
+        yield block
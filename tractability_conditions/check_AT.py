@@ -1,18 +1,22 @@
+from predicate import Predicate, as_predicate
+import instrumentation
+
 """
 Checks if the polymorphisms of fiPCSP(A, OR) contain the AT family.
 Based on Lemma 4.5.
 """
 
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     """
     Check if AT is a polymorphism.
     """
 
+    predicate = as_predicate(predicate)
     if not predicate:
         return True
 
-    k = len(predicate[0])
-    set_bits = [int(assign, 2) for assign in predicate]
+    k = predicate.k
+    set_bits = predicate.assignments
 
     import gurobipy as gp
     from gurobipy import GRB       
@@ -57,6 +61,7 @@ def check(predicate: list[str]) -> bool:
         add_constraint(var == goal)
     
     m.setObjective(goal, GRB.MINIMIZE)
+    instrumentation.count('lp_solves')
     m.optimize()
     
     if m.Status == GRB.INFEASIBLE:
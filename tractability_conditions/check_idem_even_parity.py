@@ -1,17 +1,20 @@
+from predicate import Predicate, as_predicate
+
 """
 Checks if the polymorphisms of fiPCSP(A, OR) contain the idempotized even parity family.
 Based on Lemma 4.7.
 """
 
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     """
     Check if idempotized even parity is a polymorphism.
     """
+    predicate = as_predicate(predicate)
     if not predicate:
         return True
 
-    k = len(predicate[0])
-    set_bits = [int(assign, 2) for assign in predicate]
+    k = predicate.k
+    set_bits = predicate.assignments
 
     for mask0 in range(2**k):
         # 0 bits in mask0 forces coordinates to be 0
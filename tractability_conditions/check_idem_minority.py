@@ -1,17 +1,21 @@
+from predicate import Predicate, as_predicate
+import instrumentation
+
 """
 Checks if the polymorphisms of fiPCSP(A, OR) contain the idempotized minorty family.
 Based on Lemma 4.6.
 """
 
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     """
     Check if idempotized minority is a polymorphism.
     """
+    predicate = as_predicate(predicate)
     if not predicate:
         return True
 
-    k = len(predicate[0])
-    set_bits = [int(assign, 2) for assign in predicate]
+    k = predicate.k
+    set_bits = predicate.assignments
     
     for mask0 in range(2**k):
         # 0 bits in mask forces coordinates to be 0
@@ -67,6 +71,7 @@ def check(predicate: list[str]) -> bool:
                 add_constraint(lower <= kmass[i])
 
         m.setObjective(lower, GRB.MAXIMIZE)
+        instrumentation.count('lp_solves')
         m.optimize()
         
         if get_value(lower) > 0.5 + 1e-9:
@@ -1,25 +1,22 @@
+from predicate import Predicate, as_predicate
+import instrumentation
+
 """
 Checks if the polymorphisms of fiPCSP(A, OR) contain the majority family.
 Based on Lemma 4.3.
 """
 
-def predicate_to_bitmask(predicate: list[str]) -> int:
-    out = 0
-    for assign in predicate:
-        out |= 1 << int(assign, 2)
-    return out
-
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     """
     Check if majority is a polymorphism.
     """
 
+    predicate = as_predicate(predicate)
     if not predicate:
         return True
 
-    k = len(predicate[0])
-    bitmask = predicate_to_bitmask(predicate)
-    set_bits = [int(assign, 2) for assign in predicate]
+    k = predicate.k
+    set_bits = predicate.assignments
     
     import gurobipy as gp
     from gurobipy import GRB       
@@ -59,6 +56,7 @@ def check(predicate: list[str]) -> bool:
         add_constraint(upper >= var)
 
     m.setObjective(upper, GRB.MINIMIZE)
+    instrumentation.count('lp_solves')
     m.optimize()
     
     return get_value(upper) >= 0.5 - 1e-9
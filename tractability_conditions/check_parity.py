@@ -1,18 +1,21 @@
+from predicate import Predicate, as_predicate
+
 """
 Checks if the polymorphisms of fiPCSP(A, OR) contain the parity family.
 Based on Lemma 4.4.
 """
 
-def check(predicate: list[str]) -> bool:
+def check(predicate: Predicate | list[str]) -> bool:
     """
     Check if odd parity is a polymorphism.
     """
 
+    predicate = as_predicate(predicate)
     if not predicate:
         return True
 
-    k = len(predicate[0])
-    set_bits = [int(assign, 2) for assign in predicate]
+    k = predicate.k
+    set_bits = predicate.assignments
     
     A = [a + 2**k for a in set_bits]
     B = []
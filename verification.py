@@ -1,92 +1,79 @@
-from bitset import bitset
+from bitset import bitset, new_bitset
 import parse_tables
+from predicate import Predicate, as_predicate
+import cache
+from checkpoint import Checkpoint
+import parallel_checks
+import predicate_maps
+import burnside
 from block_symmetry.check_block_sym import check_block_sym
 from functools import lru_cache as memoization
+from instrumentation import instrumented
+import instrumentation
+from collections.abc import Callable, Iterator
+from array import array
 
 """
     This file contains functions for verifying correctness of the tables corresponding
     to tractability and hardness of fiPCSP(A, OR).
 """
 
+def get_table_filenames(k: int) -> list[str]:
+    return ['tables/%s_k%d.txt' % (name, k) for name in ('maximal_tractable', 'minimal_hard', 'maximal_unknown', 'minimal_unknown')]
+
 @memoization
-def get_tables(k:int) -> tuple[list[list[str]]]:
+def get_tables(k:int) -> tuple[list[Predicate]]:
+    maximal_tractable_file, minimal_hard_file, maximal_unknown_file, minimal_unknown_file = get_table_filenames(k)
+
     # Table with "hardest" tracable predicates
-    maximal_tractable = parse_tables.read('tables/maximal_tractable_k%d.txt' % k)
+    maximal_tractable = parse_tables.read(maximal_tractable_file)
     
     # Table  with "easiest" hard predicates
-    minimal_hard = parse_tables.read('tables/minimal_hard_k%d.txt' % k)
+    minimal_hard = parse_tables.read(minimal_hard_file)
     
     # Table with "hardest" unknown predicates
-    maximal_unknown = parse_tables.read('tables/maximal_unknown_k%d.txt' % k)
+    maximal_unknown = parse_tables.read(maximal_unknown_file)
     
     # Table with "easiest" unknown predicates
-    minimal_unknown = parse_tables.read('tables/minimal_unknown_k%d.txt' % k)
+    minimal_unknown = parse_tables.read(minimal_unknown_file)
     return maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown
 
-def apply_permutation(predicate: list[str], permutation: list[int]) -> list[str]:
-    out = []
-    for assign in predicate:
-        permuted_assignment = ''.join(assign[i] for i in permutation)
-        out.append(permuted_assignment)
-    out.sort()
-    return out
-
-def all_permutations(predicate: list[str]) -> list[list[str]]:
-    if not predicate:
-        return []
-
-    import itertools
-    k = len(predicate[0])
-    permutations = itertools.permutations(range(k))
-
-    out = []
-    for permutation in permutations:
-        permuted_predicate = apply_permutation(predicate, permutation)
-        if permuted_predicate not in out:
-            out.append(permuted_predicate)
-
-    return out
-
-def predicate_to_bitmask(predicate: list[str]) -> int:
-    out = 0
-    for assign in predicate:
-        out |= 1 << int(assign, 2)
-    return out
+def predicate_to_bitmask(predicate: Predicate | list[str]) -> int:
+    return as_predicate(predicate).bitmask
 
 @memoization
 def get_bitsets(k: int) -> tuple[bitset]:
+    """
+        Returns the bitsets of tractable, unknown and hard predicates.
+        These are stored in (and loaded from) the on-disk cache.
+    """
+    return cache.cached_bitsets('bitsets_k%d' % k, get_table_filenames(k), lambda: build_bitsets(k))
+
+def build_bitsets(k: int) -> tuple[bitset]:
     maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown = get_tables(k)
     m = 2**(2**k)
     
     # Find all tractable predicates
-    tractable_bitset = bitset(m)
+    tractable_bitset = new_bitset(m)
     
     # Fill in the maximal tractable predicates
     for predicate in maximal_tractable:
-        for p in map(predicate_to_bitmask, all_permutations(predicate)):
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation'):
             tractable_bitset[p] = 1
     
     # Fill in implications
-    for i in range(0, m, 2)[::-1]:
-        if tractable_bitset[i]:
-            for bit in range(1, 2**k):
-                i2 = i & ~(1 << bit)
-                tractable_bitset[i2] = 1
+    tractable_bitset.downward_close(range(1, 2**k))
     
     # Find all hard predicates
-    hard_bitset = bitset(m)
+    hard_bitset = new_bitset(m)
     
     # Fill in the minimal hard predicates
     for predicate in minimal_hard:
-        for p in map(predicate_to_bitmask, all_permutations(predicate)):
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation'):
             hard_bitset[p] = 1
     
     # Fill in implications
-    for i in range(0, m, 2):
-        if hard_bitset[i]:
-            for bit in range(1, 2**k):
-                i2 = i | (1 << bit)
-                hard_bitset[i2] = 1
+    hard_bitset.upward_close(range(1, 2**k))
 
     
     # Find all tractable + unknown predicates
@@ -94,15 +81,11 @@ def get_bitsets(k: int) -> tuple[bitset]:
     
     # Fill in the maximal unknown predicates
     for predicate in maximal_unknown:
-        for p in map(predicate_to_bitmask, all_permutations(predicate)):
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation'):
             tractable_and_unknown_bitset[p] = 1
     
     # Fill in implications
-    for i in range(0, m, 2)[::-1]:
-        if tractable_and_unknown_bitset[i]:
-            for bit in range(1, 2**k):
-                i2 = i & ~(1 << bit)
-                tractable_and_unknown_bitset[i2] = 1
+    tractable_and_unknown_bitset.downward_close(range(1, 2**k))
 
     
     # Find all hard + unknown predicates
@@ -110,21 +93,18 @@ def get_bitsets(k: int) -> tuple[bitset]:
     
     # Fill in the minimal unknown predicates
     for predicate in minimal_unknown:
-        for p in map(predicate_to_bitmask, all_permutations(predicate)):
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation'):
             hard_and_unknown_bitset[p] = 1
     
     # Fill in implications
-    for i in range(0, m, 2):
-        if hard_and_unknown_bitset[i]:
-            for bit in range(1, 2**k):
-                i2 = i | (1 << bit)
-                hard_and_unknown_bitset[i2] = 1
+    hard_and_unknown_bitset.upward_close(range(1, 2**k))
 
 
     # Unknown predicates lie in the intersection of the two bitsets
     unknown_bitset = tractable_and_unknown_bitset & hard_and_unknown_bitset
     return tractable_bitset, unknown_bitset, hard_bitset
 
+@instrumented
 def verify_coverage(k: int) -> bool:
     """
         The minimal/maximal tables should cover all possible predicates.
@@ -160,7 +140,7 @@ def verify_coverage(k: int) -> bool:
         assert hard_bitset[p]
         for bit in range(1, 2**k):
             if p & (1 << bit):
-                assert not hard_bitset[p | ~(1 << bit)]
+                assert not hard_bitset[p & ~(1 << bit)]
 
     # Verify maximality of maximal_unknown
     for predicate in maximal_unknown:
@@ -178,11 +158,40 @@ def verify_coverage(k: int) -> bool:
         assert unknown_bitset[p]
         for bit in range(1, 2**k):
             if p & (1 << bit):
-                assert not unknown_bitset[p | ~(1 << bit)]
+                assert not unknown_bitset[p & ~(1 << bit)]
 
     return True
 
-def is_tractable(predicate: list[str]) -> bool:
+def verify_tables(name: str, k: int, check: Callable[[Predicate], bool], expected: list[bool | None]) -> bool:
+    """
+    Verifies that check(predicate) == expected[i] for every predicate in the i-th table of
+    get_tables(k) (tables with expected[i] None are skipped). The predicates are checked
+    by parallel_checks.check_predicates, and the results are checkpointed under name.
+    Every predicate failing the verification is reported by its table and index.
+    """
+    filenames = get_table_filenames(k)
+    tables = get_tables(k)
+    labels = []
+    predicates = []
+    for filename, table, value in zip(filenames, tables, expected):
+        if value is not None:
+            labels += [(filename, i, value) for i in range(len(table))]
+            predicates += table
+
+    with Checkpoint('%s_k%d' % (name, k), filenames) as checkpoint:
+        results = parallel_checks.check_predicates(predicates, check, checkpoint)
+
+    success = True
+    for (filename, i, value), predicate, result in zip(labels, predicates, results):
+        if result is None:
+            print('Failed: %s of predicate %d of %s (%s) timed out after %s s' % (check.__name__, i, filename, predicate, parallel_checks.TIMEOUT))
+            success = False
+        elif result != value:
+            print('Failed: %s of predicate %d of %s (%s) is %s, expected %s' % (check.__name__, i, filename, predicate, result, value))
+            success = False
+    return success
+
+def is_tractable(predicate: Predicate | list[str]) -> bool:
     """
     Check if fiPCSP(predicate, OR) contains any of the (block)-symmetric families
     1. Majority
@@ -191,6 +200,7 @@ def is_tractable(predicate: list[str]) -> bool:
     4. Idempotenized even party
     5. Idempotenized minority 
     """
+    instrumentation.count('predicates_checked')
 
     # Import the check-function from the python files used to test if majority/parity/etc... are polymorphism
     tractability_conditions = ["check_majority", "check_parity", "check_AT", "check_idem_even_parity", "check_idem_minority"]
@@ -199,14 +209,13 @@ def is_tractable(predicate: list[str]) -> bool:
     # The predicate is tractable if it contains at least one block-symmetric family
     return any(check(predicate) for check in checks)
 
+@instrumented
 def verify_tractability(k: int) -> bool:
     """
     Verifies that: 
         1. At least one tractability condition is satisfied for every predicate in maximal_tractable
         2. No tractability conditions are satisfied for predicates in minimal_hard, minimal_unknown, maximal_unknown
     """
-    maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown = get_tables(k)
-
     try:
         import gurobipy as gp
     except ModuleNotFoundError:
@@ -214,15 +223,10 @@ def verify_tractability(k: int) -> bool:
         print('Aborting.')
         return False
 
-    for predicate in maximal_tractable:
-        assert is_tractable(predicate)
-
-    for predicate in minimal_hard + minimal_unknown + maximal_unknown:
-        assert not is_tractable(predicate)
-
-    return True
+    # Order of the tables: maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown
+    return verify_tables('tractability', k, is_tractable, [True, False, False, False])
 
-def is_hard(predicate: list[str]) -> bool:
+def is_hard(predicate: Predicate | list[str]) -> bool:
     """
     Checks if predicate satisfies any of the hardness conditions given by Theorems
     5.16, 5.17, 5.18 or 5.21.
@@ -233,69 +237,34 @@ def is_hard(predicate: list[str]) -> bool:
             but where our tests are unnable to confirm that such is the case.
             However, we cannot get a false positive.
     """
-    import hardness_conditions.check_ADA_free
-    import hardness_conditions.check_ANDNOR_free
-    import hardness_conditions.check_bounded_inverted_matching
-    import hardness_conditions.check_bounded_matching
-    import hardness_conditions.check_unate
-    import hardness_conditions.check_UnCADA_free
-    import hardness_conditions.check_UnDADA_free
-
-    ADA_free = hardness_conditions.check_ADA_free.check
-    ANDNOR_free = hardness_conditions.check_ANDNOR_free.check
-    bounded_inverted_matching = hardness_conditions.check_bounded_inverted_matching.check
-    bounded_matching = hardness_conditions.check_bounded_matching.check
-    unate = hardness_conditions.check_unate.check
-    UnCADA_free = hardness_conditions.check_UnCADA_free.check
-    UnDADA_free = hardness_conditions.check_UnDADA_free.check
-
-    if ADA_free(predicate):
-        # Theorem 5.16
-        if bounded_matching(predicate):
-            return True
-        
-        # Theorem 5.17
-        if bounded_inverted_matching(predicate):
-            return True
-        
-        if unate(predicate):
-            # Theorem 5.18
-            if ANDNOR_free(predicate):
-                return True
-        
-            # Theorem 5.21
-            if UnCADA_free(predicate) and UnDADA_free(predicate):
-                return True
-
-    return False
+    instrumentation.count('predicates_checked')
+
+    # The sub-conditions and the order they are evaluated in are listed in hardness_conditions/registry.py
+    import hardness_conditions.registry
+    return hardness_conditions.registry.is_hard(predicate)
 
+@instrumented
 def verify_hardness(k: int) -> bool:
     """
     Verifies that: 
         1. At least one hardness condition is satisfied for every predicate in maximal_hard
         2. No hardness conditions are satisfied for predicates in maximal_tractable, minimal_unknown, maximal_unknown
     """
-    maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown = get_tables(k)
+    # Order of the tables: maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown
+    return verify_tables('hardness', k, is_hard, [False, True, False, False])
 
-    for predicate in minimal_hard:
-        assert is_hard(predicate)
-    
-    for predicate in maximal_tractable + minimal_unknown + maximal_unknown:
-        assert not is_hard(predicate)
-    
-    return True
-
-def is_missing_block_sym(predicate: list[str]) -> bool:
+def is_missing_block_sym(predicate: Predicate | list[str]) -> bool:
+    instrumentation.count('predicates_checked')
     L, assign = check_block_sym(predicate)
     # Emtpy truth table corresponds to missing block symmetric polymorphism
     return len(assign) == 0
 
+@instrumented
 def verify_block_sym(k: int) -> bool:
     """
     Verifies that, for every predicate in minimal_hard, maximal_unknown and minimal_unknown, 
     there exists some L such that the predicate does not have an L x (L + 1) block symmetric polymorphism.
     """
-    maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown = get_tables(k)
     try:
         from pysat.solvers import Glucose3
     except ModuleNotFoundError:
@@ -303,11 +272,10 @@ def verify_block_sym(k: int) -> bool:
         print('Aborting.')
         return False
 
-    for predicate in minimal_hard + maximal_unknown + minimal_unknown:
-        assert is_missing_block_sym(predicate)
-
-    return True
+    # Order of the tables: maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown
+    return verify_tables('block_sym', k, is_missing_block_sym, [None, True, True, True])
 
+@instrumented
 def verify_representative_lexographically_smallest(k: int) -> bool:
     """
     Verifies that the representatives are lexographically smallest with respect to permutations.
@@ -315,10 +283,8 @@ def verify_representative_lexographically_smallest(k: int) -> bool:
     """
     maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown = get_tables(k)
     for predicate in maximal_tractable + minimal_hard + maximal_unknown + minimal_unknown:
-        p1 = predicate_to_bitmask(predicate)
-        for predicate2 in all_permutations(predicate):
-            p2 = predicate_to_bitmask(predicate2)
-            assert p1 <= p2
+        p = predicate_to_bitmask(predicate)
+        assert p == predicate_maps.canonical(p, k, 'permutation')
     
     for predicates in maximal_tractable, minimal_hard, maximal_unknown, minimal_unknown:
         prev = None
@@ -329,75 +295,133 @@ def verify_representative_lexographically_smallest(k: int) -> bool:
 
     return True
 
-@memoization
-def get_representatives(k: int) -> list[int]:
-    """
-    Computes all representatives with respect to permutations.
+# Representatives are generated and streamed in blocks of this size
+REPRESENTATIVES_BLOCK_SIZE = 2**16
+
+# Number of processes used to generate the representatives (see generate_representatives)
+REPRESENTATIVES_PROCESSES = 1
+
+def generate_representatives(k: int, block_size: int = REPRESENTATIVES_BLOCK_SIZE, processes: int = 1, done: array | None = None) -> Iterator[array]:
     """
+    Generates all representatives with respect to permutations,
+    in increasing order, in blocks of block_size.
+
+    If processes > 1, a predicate is instead tested to be the smallest in its orbit,
+    which is done in parallel on shards of the range of predicates.
 
-    # Uses bitmasks instead of bitstrings for enhanced performance
-    import itertools
-    permutations = itertools.permutations(range(k)) 
-    maps = []
-    for permutation in permutations:
-        mapping = [0] * 2**k
-        for bitstring in parse_tables.all_bitstrings(k):
-            permuted_bitstring = ''.join(bitstring[i] for i in permutation)
-            mapping[int(bitstring, 2)] = int(permuted_bitstring, 2)
-        maps.append(mapping)
-
-    def apply_map(p, mapping):
-        q = 0
-        for i in range(2**k):
-            q |= ((p >> i) & 1) << mapping[i]
-        return q
-
-    representatives = []
+    If done is given, only the representatives following the last representative in done are generated.
+    The orbits of the earlier representatives are then not known, so every following
+    predicate is tested to be the smallest in its orbit instead.
+    """
     m = 2**(2**k)
-    found = bitset(m)
-    for p in range(2, m, 2):
+    start = done[-1] + 2 if done else 2
+    if processes > 1:
+        yield from predicate_maps.sharded_orbit_minimal('permutation', k, start, m, 2, processes, block_size)
+        return
+
+    # Uses bitmasks instead of bitstrings, and lookup tables to apply the maps, for enhanced performance
+    maps = predicate_maps.compiled_permutation_maps(k)
+
+    # Predicates are stored as 32 bit integers
+    assert 2**k <= 32
+
+    block = array('I')
+    if done:
+        for p in range(start, m, 2):
+            if predicate_maps.is_orbit_minimal(p, maps):
+                block.append(p)
+                if len(block) == block_size:
+                    yield block
+                    block = array('I')
+        if block:
+            yield block
+        return
+
+    found = new_bitset(m)
+    for p in range(start, m, 2):
         if found[p]:
             continue
-        representatives.append(p)
-        for mapping in maps:
-            q = apply_map(p, mapping)
-            found[q] =1
-    
-    return representatives
+        block.append(p)
+        if len(block) == block_size:
+            yield block
+            block = array('I')
+        for apply_map in maps:
+            found[apply_map(p)] = 1
 
+    if block:
+        yield block
+
+def iter_representatives(k: int, block_size: int = REPRESENTATIVES_BLOCK_SIZE, processes: int | None = None) -> Iterator[array]:
+    """
+    Streams all representatives with respect to permutations,
+    in increasing order, in blocks of (at most) block_size.
+    The representatives are dumped to the on-disk cache, and streamed from there if possible.
+    """
+    if processes is None:
+        processes = REPRESENTATIVES_PROCESSES
+    return cache.cached_blocks('representatives_k%d' % k, 'I', lambda done: generate_representatives(k, block_size, processes, done), block_size)
+
+def get_representatives(k: int) -> list[int]:
+    """
+    Computes all representatives with respect to permutations.
+    """
+    return [p for block in iter_representatives(k) for p in block]
+
+# Number of tractable/unknown/hard representatives stated in the paper
+PAPER_COUNTS = {
+    2: (5, 0, 0),
+    3: (33, 0, 6),
+    4: (956, 0, 1035),
+    5: (1290862, 189, 17375572),
+}
+
+@instrumented
 def verify_counts(k: int) -> bool:
     """
     Checks that the counts of tractable/hard/unknown predicate matches the numbers in the paper
     """
     tractable_bitset, unknown_bitset, hard_bitset = get_bitsets(k)
-    representatives = get_representatives(k)
 
     tractable_count = unknown_count = hard_count = 0
-    for p in representatives:
-        if tractable_bitset[p]:
-            tractable_count += 1
-        if unknown_bitset[p]:
-            unknown_count += 1
-        if hard_bitset[p]:
-            hard_count += 1
-
-    assert len(representatives) == tractable_count + unknown_count + hard_count
-
-    if k == 2:
-        assert tractable_count == 5
-        assert unknown_count   == 0
-        assert hard_count      == 0
-    elif k == 3:
-        assert tractable_count == 33
-        assert unknown_count   == 0
-        assert hard_count      == 6
-    elif k == 4:
-        assert tractable_count == 956
-        assert unknown_count   == 0
-        assert hard_count      == 1035
-    elif k == 5:
-        assert tractable_count == 1290862
-        assert unknown_count   == 189
-        assert hard_count      == 17375572
+    representatives_count = 0
+    for block in iter_representatives(k):
+        representatives_count += len(block)
+        for p in block:
+            if tractable_bitset[p]:
+                tractable_count += 1
+            if unknown_bitset[p]:
+                unknown_count += 1
+            if hard_bitset[p]:
+                hard_count += 1
+
+    assert representatives_count == tractable_count + unknown_count + hard_count
+
+    if k in PAPER_COUNTS:
+        assert (tractable_count, unknown_count, hard_count) == PAPER_COUNTS[k]
+
+    return True
+
+def count_representatives_burnside(k: int) -> tuple[int]:
+    """
+    Counts the tractable/unknown/hard representatives using Burnside's lemma,
+    without enumerating the representatives.
+    """
+    tractable_bitset, unknown_bitset, hard_bitset = get_bitsets(k)
+    classes = burnside.conjugacy_classes(predicate_maps.permutation_maps(k))
+
+    # The empty predicate is not a representative
+    return tuple(burnside.count_orbits(b, classes, exclude=[0]) for b in (tractable_bitset, unknown_bitset, hard_bitset))
+
+@instrumented
+def verify_counts_burnside(k: int) -> bool:
+    """
+    Checks that the counts of tractable/hard/unknown predicate matches the numbers in the paper,
+    by counting orbits using Burnside's lemma. This is an independent (and much cheaper) check
+    of the counts compared to verify_counts.
+    """
+    tractable_count, unknown_count, hard_count = count_representatives_burnside(k)
+
+    if k in PAPER_COUNTS:
+        assert (tractable_count, unknown_count, hard_count) == PAPER_COUNTS[k]
 
     return True
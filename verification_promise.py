@@ -1,114 +1,77 @@
-from bitset import bitset
+from bitset import bitset, new_bitset
 import parse_tables
+from predicate import Predicate, as_predicate
+import cache
+import predicate_maps
+import burnside
 import verification
 from functools import lru_cache as memoization
+from instrumentation import instrumented
+from collections.abc import Iterator
+from array import array
 
 """
     This file contains functions for verifying correctness of the tables corresponding
     to promise usefulness/uselessness.
 """
 
+def get_table_filenames(k: int) -> list[str]:
+    return ['tables/%s_k%d.txt' % (name, k) for name in ('maximal_promise_useful', 'minimal_promise_useless', 'maximal_promise_unknown', 'minimal_promise_unknown')]
+
 @memoization
-def get_tables(k: int) -> tuple[list[list[str]]]:
+def get_tables(k: int) -> tuple[list[Predicate]]:
+    maximal_promise_useful_file, minimal_promise_useless_file, maximal_promise_unknown_file, minimal_promise_unknown_file = get_table_filenames(k)
+
     # Table with "hardest" promise useful predicates
-    maximal_promise_useful = parse_tables.read('tables/maximal_promise_useful_k%d.txt' % k)
+    maximal_promise_useful = parse_tables.read(maximal_promise_useful_file)
     
     # Table  with "easiest" promise useless predicates
-    minimal_promise_useless = parse_tables.read('tables/minimal_promise_useless_k%d.txt' % k)
+    minimal_promise_useless = parse_tables.read(minimal_promise_useless_file)
     
     # Table with "hardest" promise unknown predicates
-    maximal_promise_unknown = parse_tables.read('tables/maximal_promise_unknown_k%d.txt' % k)
+    maximal_promise_unknown = parse_tables.read(maximal_promise_unknown_file)
     
     # Table with "easiest" promise unknown predicates
-    minimal_promise_unknown = parse_tables.read('tables/minimal_promise_unknown_k%d.txt' % k)
+    minimal_promise_unknown = parse_tables.read(minimal_promise_unknown_file)
     
     return maximal_promise_useful, minimal_promise_useless, maximal_promise_unknown, minimal_promise_unknown
 
-def apply_permutation(predicate: list[str], permutation: list[int]) -> list[str]:
-    out = []
-    for assign in predicate:
-        permuted_assignment = ''.join(assign[i] for i in permutation)
-        out.append(permuted_assignment)
-    out.sort()
-    return out
-
-def all_permutations(predicate: list[str]) -> list[list[str]]:
-    if not predicate:
-        return []
-
-    import itertools
-    k = len(predicate[0])
-    permutations = itertools.permutations(range(k))
-
-    out = []
-    for permutation in permutations:
-        permuted_predicate = apply_permutation(predicate, permutation)
-        if permuted_predicate not in out:
-            out.append(permuted_predicate)
-
-    return out
-
-def xor(bitstring1: str, bitstring2: str) -> str:
-    return ''.join('0' if c1==c2 else '1' for c1,c2 in zip(bitstring1, bitstring2))
-
-def all_xors(predicate: list[str]) -> list[list[str]]:
-    if not predicate:
-        return []
-
-    k = len(predicate[0])
-    
-    out = []
-    for bitstring in parse_tables.all_bitstrings(k):
-        predicate2 = [xor(bitstring, b) for b in predicate]
-        predicate2.sort()
-        if predicate2 not in out:
-            out.append(predicate2)
-    return out
-
-def predicate_to_bitmask(predicate: list[str]) -> int:
-    out = 0
-    for assign in predicate:
-        out |= 1 << int(assign, 2)
-    return out
+def predicate_to_bitmask(predicate: Predicate | list[str]) -> int:
+    return as_predicate(predicate).bitmask
 
 @memoization
 def get_bitsets(k: int) -> tuple[bitset]:
+    """
+        Returns the bitsets of promise useful, unknown and useless predicates.
+        These are stored in (and loaded from) the on-disk cache.
+    """
+    return cache.cached_bitsets('promise_bitsets_k%d' % k, get_table_filenames(k), lambda: build_bitsets(k))
+
+def build_bitsets(k: int) -> tuple[bitset]:
     maximal_promise_useful, minimal_promise_useless, maximal_promise_unknown, minimal_promise_unknown = get_tables(k)
     m = 2**(2**k)
     
     # Find all promise useful predicates
-    promise_useful_bitset = bitset(m)
+    promise_useful_bitset = new_bitset(m)
     
     # Fill in the maximal promise useful predicates
     for predicate in maximal_promise_useful:
-        for predicate2 in all_permutations(predicate):
-            for predicate3 in all_xors(predicate2):
-                p = predicate_to_bitmask(predicate3)
-                promise_useful_bitset[p] = 1
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation_xor'):
+            promise_useful_bitset[p] = 1
     
     # Fill in implications
-    for i in range(m)[::-1]:
-        if promise_useful_bitset[i]:
-            for bit in range(2**k):
-                i2 = i & ~(1 << bit)
-                promise_useful_bitset[i2] = 1
+    promise_useful_bitset.downward_close(range(2**k))
     
     # Find all promise useless predicates
-    promise_useless_bitset = bitset(m)
+    promise_useless_bitset = new_bitset(m)
     
     # Fill in the minimal promise useless predicates
     for predicate in minimal_promise_useless:
-        for predicate2 in all_permutations(predicate):
-            for predicate3 in all_xors(predicate2):
-                p = predicate_to_bitmask(predicate3)
-                promise_useless_bitset[p] = 1
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation_xor'):
+            promise_useless_bitset[p] = 1
     
     # Fill in implications
-    for i in range(m):
-        if promise_useless_bitset[i]:
-            for bit in range(2**k):
-                i2 = i | (1 << bit)
-                promise_useless_bitset[i2] = 1
+    promise_useless_bitset.upward_close(range(2**k))
     # Predicate with all bitstrings is not allowed
     promise_useless_bitset[m - 1] = 0
     
@@ -117,42 +80,31 @@ def get_bitsets(k: int) -> tuple[bitset]:
     
     # Fill in the maximal promise unknown predicates
     for predicate in maximal_promise_unknown:
-        for predicate2 in all_permutations(predicate):
-            for predicate3 in all_xors(predicate2):
-                p = predicate_to_bitmask(predicate3)
-                promise_useful_and_unknown_bitset[p] = 1
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation_xor'):
+            promise_useful_and_unknown_bitset[p] = 1
     
     # Fill in implications
-    for i in range(m)[::-1]:
-        if promise_useful_and_unknown_bitset[i]:
-            for bit in range(2**k):
-                i2 = i & ~(1 << bit)
-                promise_useful_and_unknown_bitset[i2] = 1
+    promise_useful_and_unknown_bitset.downward_close(range(2**k))
     
     # Find all promise useless + unknown predicates
     promise_useless_and_unknown_bitset = promise_useless_bitset.copy()
     
     # Fill in the minimal promise unknown predicates
     for predicate in minimal_promise_unknown:
-        for predicate2 in all_permutations(predicate):
-            for predicate3 in all_xors(predicate2):
-                p = predicate_to_bitmask(predicate3)
-                promise_useless_and_unknown_bitset[p] = 1
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'permutation_xor'):
+            promise_useless_and_unknown_bitset[p] = 1
     # Predicate with all bitstrings is not allowed
     promise_useless_and_unknown_bitset[m - 1] = 0
 
     # Fill in implications
-    for i in range(m):
-        if promise_useless_and_unknown_bitset[i]:
-            for bit in range(2**k):
-                i2 = i | (1 << bit)
-                promise_useless_and_unknown_bitset[i2] = 1
+    promise_useless_and_unknown_bitset.upward_close(range(2**k))
 
     # Promise unknown predicates lie in the intersection of the two bitsets
     promise_unknown_bitset = promise_useful_and_unknown_bitset & promise_useless_and_unknown_bitset
     return promise_useful_bitset, promise_unknown_bitset, promise_useless_bitset
 
 
+@instrumented
 def verify_coverage(k: int) -> bool:
     """
         The minimal/maximal tables should cover all possible predicates.
@@ -189,7 +141,7 @@ def verify_coverage(k: int) -> bool:
         assert promise_useless_bitset[p]
         for bit in range(2**k):
             if p & (1 << bit):
-                assert not promise_useless_bitset[p | ~(1 << bit)]
+                assert not promise_useless_bitset[p & ~(1 << bit)]
 
     # Verify maximality of maximal_promise_unknown
     for predicate in maximal_promise_unknown:
@@ -207,11 +159,12 @@ def verify_coverage(k: int) -> bool:
         assert promise_unknown_bitset[p]
         for bit in range(2**k):
             if p & (1 << bit):
-                assert not promise_unknown_bitset[p | ~(1 << bit)]
+                assert not promise_unknown_bitset[p & ~(1 << bit)]
 
     return True
 
 
+@instrumented
 def verify_promise_usefulness(k: int) -> bool:
     """
     Verifies that: 
@@ -224,21 +177,20 @@ def verify_promise_usefulness(k: int) -> bool:
     maximal_promise_useful, minimal_promise_useless, maximal_promise_unknown, minimal_promise_unknown = get_tables(k)
     
     for predicate in maximal_promise_useful:
-        for predicate2 in all_xors(predicate):
-            p = predicate_to_bitmask(predicate2)
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'xor'):
             if p&1 == 0 and tractable_bitset[p]:
                 break
         else:
             assert False
     
     for predicate in minimal_promise_useless + maximal_promise_unknown + minimal_promise_unknown:
-        for predicate2 in all_xors(predicate):
-            p = predicate_to_bitmask(predicate2)
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'xor'):
             if p&1 == 0:
                 assert not tractable_bitset[p]
     
     return True
 
+@instrumented
 def verify_promise_uselessness(k: int) -> bool:
     """
     Verifies that: 
@@ -251,14 +203,12 @@ def verify_promise_uselessness(k: int) -> bool:
     maximal_promise_useful, minimal_promise_useless, maximal_promise_unknown, minimal_promise_unknown = get_tables(k)
     
     for predicate in minimal_promise_useless:
-        for predicate2 in all_xors(predicate):
-            p = predicate_to_bitmask(predicate2)
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'xor'):
             if p&1 == 0:
                 assert hard_bitset[p]
     
     for predicate in maximal_promise_useful + maximal_promise_unknown + minimal_promise_unknown:
-        for predicate2 in all_xors(predicate):
-            p = predicate_to_bitmask(predicate2)
+        for p in predicate_maps.orbit(predicate_to_bitmask(predicate), k, 'xor'):
             if p&1 == 0 and not hard_bitset[p]:
                 break
         else:
@@ -267,6 +217,7 @@ def verify_promise_uselessness(k: int) -> bool:
     return True
 
 
+@instrumented
 def verify_representative_lexographically_smallest(k: int) -> bool:
     """
     Verifies that the representatives are lexographically smallest with respect to permutations
@@ -275,11 +226,8 @@ def verify_representative_lexographically_smallest(k: int) -> bool:
     """
     maximal_promise_useful, minimal_promise_useless, maximal_promise_unknown, minimal_promise_unknown = get_tables(k)
     for predicate in maximal_promise_useful + minimal_promise_useless + maximal_promise_unknown + minimal_promise_unknown:
-        p1 = predicate_to_bitmask(predicate)
-        for predicate2 in all_permutations(predicate):
-            for predicate3 in all_xors(predicate2):
-                p3 = predicate_to_bitmask(predicate3)
-                assert p1 <= p3
+        p = predicate_to_bitmask(predicate)
+        assert p == predicate_maps.canonical(p, k, 'permutation_xor')
     
     for predicates in maximal_promise_useful, minimal_promise_useless, maximal_promise_unknown, minimal_promise_unknown:
         prev = None
@@ -290,80 +238,135 @@ def verify_representative_lexographically_smallest(k: int) -> bool:
 
     return True
 
-@memoization
-def get_representatives(k: int) -> bool:
-    """
-    Computes all representatives with respect to permutations and xor with bitstrings.
+# Representatives are generated and streamed in blocks of this size
+REPRESENTATIVES_BLOCK_SIZE = 2**16
+
+# Number of processes used to generate the representatives (see generate_representatives)
+REPRESENTATIVES_PROCESSES = 1
+
+def generate_representatives(k: int, block_size: int = REPRESENTATIVES_BLOCK_SIZE, processes: int = 1, done: array | None = None) -> Iterator[array]:
     """
+    Generates all representatives with respect to permutations and xor with bitstrings,
+    in increasing order, in blocks of block_size.
+
+    If processes > 1, a predicate is instead tested to be the smallest in its orbit,
+    which is done in parallel on shards of the range of predicates.
 
-    # Uses bitmasks instead of bitstrings for enhanced performance
-    import itertools
-    permutations = itertools.permutations(range(k)) 
-    maps = []
-    for permutation in permutations:
-        for xor_bitstring in parse_tables.all_bitstrings(k):
-            mapping = [0] * 2**k
-            for bitstring in parse_tables.all_bitstrings(k):
-                permuted_bitstring = ''.join(bitstring[i] for i in permutation)
-                permuted_and_xored_bitstring = ''.join('1' if c1!=c2 else '0' for c1,c2 in zip(permuted_bitstring, xor_bitstring))
-                mapping[int(bitstring, 2)] = int(permuted_and_xored_bitstring, 2)
-
-            # Avoid duplicates
-            if mapping not in maps:
-                maps.append(mapping)
-
-    def apply_map(p, mapping):
-        q = 0
-        for i in range(2**k):
-            q |= ((p >> i) & 1) << mapping[i]
-        return q
-
-    representatives = []
+    If done is given, only the representatives following the last representative in done are generated.
+    The orbits of the earlier representatives are then not known, so every following
+    predicate is tested to be the smallest in its orbit instead.
+    """
     m = 2**(2**k)
-    found = bitset(m)
-    for p in range(1, m - 1):
+    start = done[-1] + 1 if done else 1
+    if processes > 1:
+        yield from predicate_maps.sharded_orbit_minimal('permutation_xor', k, start, m - 1, 1, processes, block_size)
+        return
+
+    # Uses bitmasks instead of bitstrings, and lookup tables to apply the maps, for enhanced performance
+    maps = predicate_maps.compiled_permutation_xor_maps(k)
+
+    # Predicates are stored as 32 bit integers
+    assert 2**k <= 32
+
+    block = array('I')
+    if done:
+        for p in range(start, m - 1):
+            if predicate_maps.is_orbit_minimal(p, maps):
+                block.append(p)
+                if len(block) == block_size:
+                    yield block
+                    block = array('I')
+        if block:
+            yield block
+        return
+
+    found = new_bitset(m)
+    for p in range(start, m - 1):
         if found[p]:
             continue
-        representatives.append(p)
-        for mapping in maps:
-            q = apply_map(p, mapping)
-            found[q] =1
-    
-    return representatives
+        block.append(p)
+        if len(block) == block_size:
+            yield block
+            block = array('I')
+        for apply_map in maps:
+            found[apply_map(p)] = 1
 
+    if block:
+        yield block
+
+def iter_representatives(k: int, block_size: int = REPRESENTATIVES_BLOCK_SIZE, processes: int | None = None) -> Iterator[array]:
+    """
+    Streams all representatives with respect to permutations and xor with bitstrings,
+    in increasing order, in blocks of (at most) block_size.
+    The representatives are dumped to the on-disk cache, and streamed from there if possible.
+    """
+    if processes is None:
+        processes = REPRESENTATIVES_PROCESSES
+    return cache.cached_blocks('promise_representatives_k%d' % k, 'I', lambda done: generate_representatives(k, block_size, processes, done), block_size)
+
+def get_representatives(k: int) -> list[int]:
+    """
+    Computes all representatives with respect to permutations and xor with bitstrings.
+    """
+    return [p for block in iter_representatives(k) for p in block]
+
+# Number of promise-useful/unknown/useless representatives stated in the paper
+PAPER_COUNTS = {
+    2: (4, 0, 0),
+    3: (16, 0, 4),
+    4: (230, 0, 170),
+    5: (156135, 59, 1071962),
+}
+
+@instrumented
 def verify_counts(k: int) -> bool:
     """
     Checks that the counts of promise-useful/unknown/useless predicate matches the numbers in the paper
     """
     promise_useful_bitset, promise_unknown_bitset, promise_useless_bitset = get_bitsets(k)
-    representatives = get_representatives(k)
 
     promise_useful_count = promise_unknown_count = promise_useless_count = 0
-    for p in representatives:
-        if promise_useful_bitset[p]:
-            promise_useful_count += 1
-        if promise_unknown_bitset[p]:
-            promise_unknown_count += 1
-        if promise_useless_bitset[p]:
-            promise_useless_count += 1
-
-    assert len(representatives) == promise_useful_count + promise_unknown_count + promise_useless_count
+    representatives_count = 0
+    for block in iter_representatives(k):
+        representatives_count += len(block)
+        for p in block:
+            if promise_useful_bitset[p]:
+                promise_useful_count += 1
+            if promise_unknown_bitset[p]:
+                promise_unknown_count += 1
+            if promise_useless_bitset[p]:
+                promise_useless_count += 1
+
+    assert representatives_count == promise_useful_count + promise_unknown_count + promise_useless_count
     
-    if k == 2:
-        assert promise_useful_count  == 4
-        assert promise_unknown_count == 0
-        assert promise_useless_count == 0
-    elif k == 3:
-        assert promise_useful_count  == 16
-        assert promise_unknown_count == 0
-        assert promise_useless_count == 4
-    elif k == 4:
-        assert promise_useful_count  == 230
-        assert promise_unknown_count == 0
-        assert promise_useless_count == 170
-    elif k == 5:
-        assert promise_useful_count  == 156135
-        assert promise_unknown_count == 59
-        assert promise_useless_count == 1071962
+    if k in PAPER_COUNTS:
+        assert (promise_useful_count, promise_unknown_count, promise_useless_count) == PAPER_COUNTS[k]
+
+    return True
+
+def count_representatives_burnside(k: int) -> tuple[int]:
+    """
+    Counts the promise-useful/unknown/useless representatives using Burnside's lemma
+    over the group of permutations and xors (the hyperoctahedral group),
+    without enumerating the representatives.
+    """
+    promise_useful_bitset, promise_unknown_bitset, promise_useless_bitset = get_bitsets(k)
+    classes = burnside.conjugacy_classes(predicate_maps.permutation_xor_maps(k))
+
+    # The empty predicate and the predicate with all bitstrings are not representatives
+    m = 2**(2**k)
+    return tuple(burnside.count_orbits(b, classes, exclude=[0, m - 1]) for b in (promise_useful_bitset, promise_unknown_bitset, promise_useless_bitset))
+
+@instrumented
+def verify_counts_burnside(k: int) -> bool:
+    """
+    Checks that the counts of promise-useful/unknown/useless predicate matches the numbers in the paper,
+    by counting orbits using Burnside's lemma. This is an independent (and much cheaper) check
+    of the counts compared to verify_counts.
+    """
+    promise_useful_count, promise_unknown_count, promise_useless_count = count_representatives_burnside(k)
+
+    if k in PAPER_COUNTS:
+        assert (promise_useful_count, promise_unknown_count, promise_useless_count) == PAPER_COUNTS[k]
 
     return True